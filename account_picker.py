@@ -0,0 +1,26 @@
+# account_picker.py
+
+import streamlit as st
+from database import DEFAULT_ACCOUNT_ID, get_accounts
+
+def select_account():
+    """
+    Sidebar selector for the Gmail account the page works on.
+    The choice is kept in session_state so it carries across pages.
+    """
+    accounts = get_accounts()
+    ids = [a["id"] for a in accounts]
+    names = {a["id"]: a["name"] for a in accounts}
+
+    current = st.session_state.get("account_id", DEFAULT_ACCOUNT_ID)
+    if current not in ids:
+        current = ids[0]
+
+    account_id = st.sidebar.selectbox(
+        "Gmail account",
+        ids,
+        index=ids.index(current),
+        format_func=lambda i: names[i]
+    )
+    st.session_state["account_id"] = account_id
+    return account_id
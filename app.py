@@ -3,9 +3,8 @@
 import streamlit as st
 import threading
 import time
-from database import init_db
+from database import init_db, add_account, get_accounts
 from worker import run_worker # Import the worker's main function
-import pandas as pd
 import sqlite3
 from database import DB_NAME
 import json
@@ -49,6 +48,23 @@ with col2:
 
 st.divider()
 
+st.subheader("📮 Gmail Accounts")
+
+accounts = get_accounts()
+st.write(", ".join(f"**{a['name']}**" for a in accounts))
+
+with st.expander("Add another Gmail account"):
+    new_account = st.text_input("Account name (e.g. the email address):")
+    st.caption("The first job for a new account opens a Google login screen to create its token.")
+    if st.button("Add Account"):
+        try:
+            add_account(new_account)
+            st.rerun()
+        except (ValueError, sqlite3.IntegrityError) as e:
+            st.error(f"Could not add account: {e}")
+
+st.divider()
+
 st.subheader("🤖 Background Job Status")
 
 # --- Function to get raw job data ---
@@ -56,7 +72,11 @@ def get_job_status():
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT 10") # Show 10 recent
+    c.execute("""
+    SELECT jobs.*, accounts.name AS account_name
+    FROM jobs LEFT JOIN accounts ON accounts.id = jobs.account_id
+    ORDER BY jobs.created_at DESC LIMIT 10
+    """) # Show 10 recent
     jobs = c.fetchall()
     conn.close()
     return [dict(job) for job in jobs]
@@ -69,6 +89,7 @@ def process_jobs_for_display(jobs):
         display_job = {
             "ID": job['id'],
             "Job Type": job['job_type'],
+            "Account": job['account_name'],
             "Status": job['status'],
         }
 
@@ -114,6 +135,7 @@ else:
     clean_jobs_data = process_jobs_for_display(jobs)
     
     # Display the clean data
+    import pandas as pd
     st.dataframe(pd.DataFrame(clean_jobs_data), use_container_width=True)
 
     # Add a refresh button for the job list
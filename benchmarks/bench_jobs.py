@@ -0,0 +1,308 @@
+# benchmarks/bench_jobs.py
+
+"""
+Offline throughput benchmark for the worker's FETCH / classify / DELETE /
+POLICY / CLUSTER / BACKFILL paths.
+
+Runs the real job functions from worker.py against a synthetic mailbox
+served by FakeGmailService, with FakeGroq standing in for the LLM. No
+network, no Google token and no GROQ_API_KEY are needed.
+
+Each phase runs in its own process so peak RSS is per phase.
+
+    python benchmarks/bench_jobs.py --messages 10000
+    python benchmarks/bench_jobs.py --messages 1000000 --phases classify delete
+    python benchmarks/bench_jobs.py --latency-ms 20 --rate-limit 0.01 --json bench.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+PHASES = ["fetch", "classify", "delete", "policy", "cluster", "backfill"]
+DELETE_CATEGORIES = ["Promotional", "Spam"]
+
+
+# --- Helpers ---
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class CommitCounter:
+    """Counts COMMITs on every sqlite3 connection opened after install()."""
+
+    def __init__(self):
+        self.commits = 0
+        self.connections = 0
+        self._connect = sqlite3.connect
+
+    def install(self):
+        def counting_connect(*args, **kwargs):
+            conn = self._connect(*args, **kwargs)
+            self.connections += 1
+            conn.set_trace_callback(self._trace)
+            return conn
+        sqlite3.connect = counting_connect
+
+    def uninstall(self):
+        sqlite3.connect = self._connect
+
+    def _trace(self, statement):
+        if statement.lstrip().upper().startswith("COMMIT"):
+            self.commits += 1
+
+
+def setup_environment(db_path, opts):
+    """Points the app at a scratch DB and swaps in the fake clients."""
+    import database
+    database.DB_NAME = db_path
+    database.init_db()
+
+    import classifier
+    from benchmarks.fakes import FakeGroq
+    groq = FakeGroq(opts["groq_latency"], opts["rate_limit"], opts["seed"])
+    classifier.client = groq # get_client() returns this instead of building one
+
+    import worker
+    worker.SLEEP_BETWEEN_BATCHES = 0
+    return groq
+
+
+def seed_emails(db_path, mailbox, classify):
+    """Bulk-loads the synthetic mailbox into the emails table."""
+    conn = sqlite3.connect(db_path)
+    rows = []
+    for i in range(mailbox.size):
+        subject, sender, body = mailbox.template(i)
+        rows.append(mailbox.email_row(i, classify(subject, body, sender)))
+        if len(rows) >= 10_000:
+            conn.executemany("INSERT OR IGNORE INTO emails (id, subject, sender, body, category, size, datetime) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        conn.executemany("INSERT OR IGNORE INTO emails (id, subject, sender, body, category, size, datetime) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def claim_job(job_type, parameters):
+    from database import create_job, get_next_job
+    create_job(job_type, json.dumps(parameters))
+    return get_next_job()
+
+
+def check_job(db_path, job_id):
+    """Raises if the job didn't finish, so a failed job isn't reported as a result."""
+    conn = sqlite3.connect(db_path)
+    status, message = conn.execute(
+        "SELECT status, progress_message FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    conn.close()
+    if status != "DONE":
+        raise RuntimeError(f"job {job_id} ended {status}: {message}")
+
+
+def count_rows(db_path, table):
+    conn = sqlite3.connect(db_path)
+    n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return n
+
+
+# --- Phases ---
+
+def phase_fetch(db_path, opts, mailbox, gmail, groq, commits):
+    import worker
+    job = claim_job("FETCH", {"query": ""})
+    commits.install()
+    start = time.perf_counter()
+    worker.run_fetch_job(gmail, job)
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    check_job(db_path, job["id"])
+    return elapsed, count_rows(db_path, "emails")
+
+
+def phase_classify(db_path, opts, mailbox, gmail, groq, commits):
+    from classifier import classify_email
+    commits.install()
+    start = time.perf_counter()
+    for i in range(mailbox.size):
+        subject, sender, body = mailbox.template(i)
+        try:
+            classify_email(subject, body, sender)
+        except Exception:
+            pass # Injected 429s count as processed
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    return elapsed, mailbox.size
+
+
+def phase_delete(db_path, opts, mailbox, gmail, groq, commits):
+    import worker
+    from classifier import rule_based_classify
+    seed_emails(db_path, mailbox, lambda s, b, f: rule_based_classify(s, f, b) or "Work")
+    job = claim_job("DELETE", {"categories": DELETE_CATEGORIES})
+    commits.install()
+    start = time.perf_counter()
+    worker.run_delete_job(gmail, job)
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    check_job(db_path, job["id"])
+    return elapsed, count_rows(db_path, "deleted_emails")
+
+
+def phase_policy(db_path, opts, mailbox, gmail, groq, commits):
+    import worker
+    from classifier import rule_based_classify
+    seed_emails(db_path, mailbox, lambda s, b, f: rule_based_classify(s, f, b) or "Work")
+    job = claim_job("POLICY", {"use_default_rules": True})
+    commits.install()
+    start = time.perf_counter()
+    worker.run_policy_job(gmail, job)
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    check_job(db_path, job["id"])
+    return elapsed, count_rows(db_path, "deleted_emails")
+
+
+def phase_cluster(db_path, opts, mailbox, gmail, groq, commits):
+    import worker
+    from classifier import rule_based_classify
+    seed_emails(db_path, mailbox, lambda s, b, f: rule_based_classify(s, f, b) or "Work")
+    job = claim_job("CLUSTER", {})
+    commits.install()
+    start = time.perf_counter()
+    worker.run_cluster_job(None, job)
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    check_job(db_path, job["id"])
+    conn = sqlite3.connect(db_path)
+    indexed = conn.execute("SELECT COUNT(*) FROM emails WHERE cluster_id IS NOT NULL").fetchone()[0]
+    conn.close()
+    return elapsed, indexed
+
+
+def phase_backfill(db_path, opts, mailbox, gmail, groq, commits):
+    import worker
+    shard_size = max(1000, mailbox.size // 20)
+    job = claim_job("BACKFILL", {"query": "", "shard_size": shard_size})
+    commits.install()
+    start = time.perf_counter()
+    worker.run_backfill_job(gmail, job, service_factory=gmail.new_service)
+    elapsed = time.perf_counter() - start
+    commits.uninstall()
+    check_job(db_path, job["id"])
+    return elapsed, count_rows(db_path, "emails")
+
+
+PHASE_RUNNERS = {
+    "fetch": phase_fetch,
+    "classify": phase_classify,
+    "delete": phase_delete,
+    "policy": phase_policy,
+    "cluster": phase_cluster,
+    "backfill": phase_backfill,
+}
+
+
+def run_phase(phase, opts, results):
+    """Child-process entry point: runs one phase and reports its numbers."""
+    from benchmarks.fakes import FakeGmailService, SyntheticMailbox
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        try:
+            groq = setup_environment(db_path, opts)
+            mailbox = SyntheticMailbox(opts["messages"])
+            gmail = FakeGmailService(mailbox, opts["latency"], opts["rate_limit"], opts["seed"])
+            commits = CommitCounter()
+
+            elapsed, processed = PHASE_RUNNERS[phase](db_path, opts, mailbox, gmail, groq, commits)
+        except Exception as e:
+            results.put({"phase": phase, "error": f"{type(e).__name__}: {e}"})
+            return
+
+        results.put({
+            "phase": phase,
+            "messages": opts["messages"],
+            "processed": processed,
+            "seconds": round(elapsed, 3),
+            "emails_per_sec": round(processed / elapsed, 1) if elapsed else None,
+            "gmail": gmail.counter.snapshot(),
+            "groq": groq.counter.snapshot(),
+            "db_commits": commits.commits,
+            "db_connections": commits.connections,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+
+
+def print_report(rows):
+    header = f"{'phase':<10}{'processed':>11}{'sec':>10}{'emails/s':>11}{'gmail':>9}{'groq':>8}{'429s':>7}{'commits':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        throttled = r["gmail"]["rate_limited"] + r["groq"]["rate_limited"]
+        print(
+            f"{r['phase']:<10}{r['processed']:>11}{r['seconds']:>10.2f}"
+            f"{(r['emails_per_sec'] or 0):>11.1f}{r['gmail']['total_calls']:>9}"
+            f"{r['groq']['total_calls']:>8}{throttled:>7}{r['db_commits']:>10}{r['peak_rss_mb']:>9.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the background worker.")
+    parser.add_argument("--messages", type=int, default=10_000, help="Synthetic mailbox size (10k - 1M).")
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=PHASES)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every Gmail call.")
+    parser.add_argument("--groq-latency-ms", type=float, default=0.0, help="Latency added to every Groq call.")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of calls that fail with HTTP 429.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    opts = {
+        "messages": args.messages,
+        "latency": args.latency_ms / 1000,
+        "groq_latency": args.groq_latency_ms / 1000,
+        "rate_limit": args.rate_limit,
+        "seed": args.seed,
+    }
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for phase in args.phases:
+        results = ctx.Queue()
+        proc = ctx.Process(target=run_phase, args=(phase, opts, results))
+        proc.start()
+        row = results.get()
+        proc.join()
+        if "error" in row:
+            print(f"Phase '{phase}' failed: {row['error']}", file=sys.stderr)
+            return None
+        rows.append(row)
+
+    print_report(rows)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    if main() is None:
+        sys.exit(1)
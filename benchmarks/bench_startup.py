@@ -0,0 +1,106 @@
+# benchmarks/bench_startup.py
+
+"""
+Cold-start benchmark: how long it takes to import the app's modules.
+
+Every sample runs in a fresh interpreter, so nothing is cached in
+sys.modules. For each target it reports the median import time and
+which heavy third-party packages the import dragged in (these should
+only load on first use).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ["database", "classifier", "gmail_pool", "fetch_emails", "worker"]
+
+HEAVY_MODULES = ["pandas", "groq", "googleapiclient", "google.oauth2", "google_auth_oauthlib"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+# Builds the Gmail service from the bundled discovery document without
+# credentials, to time the part of gmail_connect() that used to fetch it.
+BUILD_PROBE = """
+import json, time
+import httplib2
+from googleapiclient.discovery import build
+start = time.perf_counter()
+build("gmail", "v1", http=httplib2.Http(), static_discovery=True, cache_discovery=False)
+print(json.dumps({"seconds": time.perf_counter() - start, "loaded": []}))
+"""
+
+
+def run_probe(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return None, error[-1] if error else "unknown error"
+    return json.loads(result.stdout.strip().splitlines()[-1]), None
+
+
+def measure(name, code, runs):
+    samples, loaded = [], []
+    for _ in range(runs):
+        data, error = run_probe(code)
+        if error:
+            return {"target": name, "error": error}
+        samples.append(data["seconds"])
+        loaded = data["loaded"]
+    return {
+        "target": name,
+        "runs": runs,
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark for app and worker cold start.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per target.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for target in TARGETS:
+        rows.append(measure(f"import {target}", IMPORT_PROBE.format(target=target, heavy=HEAVY_MODULES), args.runs))
+    rows.append(measure("gmail build (static discovery)", BUILD_PROBE, args.runs))
+
+    print(f"{'target':<34}{'median ms':>11}{'min ms':>10}  heavy modules loaded")
+    print("-" * 80)
+    for r in rows:
+        if "error" in r:
+            print(f"{r['target']:<34}  skipped: {r['error']}")
+            continue
+        loaded = ", ".join(r["heavy_modules_loaded"]) or "-"
+        print(f"{r['target']:<34}{r['median_ms']:>11.2f}{r['min_ms']:>10.2f}  {loaded}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/check_policy.py
+
+"""
+Equivalence check for POLICY jobs: the SQL predicate built by
+cleaner.compile_policy must select exactly the emails that
+cleaner.rule_matches (and so should_delete) selects row by row.
+
+Runs on a scratch DB seeded from the synthetic mailbox plus senders that
+contain LIKE wildcards, mixed case and non-ASCII text. Exits non-zero if
+any policy selects different emails in SQL and in Python.
+
+    python benchmarks/check_policy.py
+    python benchmarks/check_policy.py --messages 100000
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Senders that a LIKE '%...%' translation would get wrong
+EDGE_SENDERS = [
+    "no_reply@x.com",
+    "noXreply@x.com",
+    "NO_REPLY@X.COM",
+    "100%off@deals.com",
+    "1000off@deals.com",
+    "back\\slash@x.com",
+    "Ünïcode <ÜBER@x.com>",
+    "über@x.com",
+    None,
+]
+
+POLICIES = [
+    [{"sender": "no_reply"}],
+    [{"sender": "NO_REPLY"}],
+    [{"sender": "100%"}],
+    [{"sender": "back\\slash"}],
+    [{"sender": "Über"}],
+    [{"sender": "über"}],
+    [{"sender": "example.com", "category": "Newsletter"}],
+    [{"category": ["Promotional", "Spam"]}],
+    [{"older_than_days": 365}],
+    [{"older_than_days": 30, "larger_than_bytes": 100_000}],
+    [{"sender": "shop", "older_than_days": 90}, {"larger_than_bytes": 5 * 1024 * 1024}],
+]
+
+
+def seed(db_path, messages):
+    import database
+    from benchmarks.fakes import SyntheticMailbox
+    from classifier import rule_based_classify
+
+    database.DB_NAME = db_path
+    database.init_db()
+
+    mailbox = SyntheticMailbox(messages)
+    rows = []
+    for i in range(mailbox.size):
+        subject, sender, body = mailbox.template(i)
+        rows.append(mailbox.email_row(i, rule_based_classify(subject, sender, body) or "Work"))
+    # Edge-case senders on top of the regular mail, at varying ages
+    for j, sender in enumerate(EDGE_SENDERS):
+        i = mailbox.size + j
+        row = list(mailbox.email_row(j * 97 % mailbox.size, "Newsletter"))
+        row[0], row[2] = mailbox.message_id(i), sender
+        rows.append(tuple(row))
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO emails (id, subject, sender, body, category, size, datetime) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def load_emails(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    emails = []
+    for row in conn.execute("SELECT id, sender, category, size, datetime FROM emails"):
+        email = dict(row)
+        email["datetime"] = datetime.datetime.fromisoformat(email["datetime"])
+        emails.append(email)
+    conn.close()
+    return emails
+
+
+def check(db_path, emails, policy, now):
+    from cleaner import compile_policy, rule_matches
+
+    where_sql, params = compile_policy(policy, now=now)
+    conn = sqlite3.connect(db_path)
+    in_sql = {row[0] for row in conn.execute(f"SELECT id FROM emails WHERE {where_sql}", params)}
+    conn.close()
+    in_python = {e["id"] for e in emails if any(rule_matches(e, rule, now) for rule in policy)}
+    return in_sql, in_python
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that compiled POLICY SQL matches should_delete.")
+    parser.add_argument("--messages", type=int, default=20_000, help="Synthetic mailbox size.")
+    args = parser.parse_args(argv)
+
+    now = datetime.datetime.now()
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "check.db")
+        seed(db_path, args.messages)
+        emails = load_emails(db_path)
+
+        for policy in POLICIES:
+            in_sql, in_python = check(db_path, emails, policy, now)
+            ok = in_sql == in_python
+            mismatches += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} sql={len(in_sql):>7} python={len(in_python):>7}  {policy}")
+            if not ok:
+                print(f"     only in SQL: {sorted(in_sql - in_python)[:5]}")
+                print(f"     only in Python: {sorted(in_python - in_sql)[:5]}")
+
+    print(f"{len(POLICIES) - mismatches}/{len(POLICIES)} policies agree.")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
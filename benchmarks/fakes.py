@@ -0,0 +1,369 @@
+# benchmarks/fakes.py
+
+"""
+In-process fakes for the Gmail discovery service and the Groq client.
+
+They mimic just enough of the real client surface for the worker to run
+against a synthetic mailbox: messages().list/get/delete/batchDelete,
+new_batch_http_request() and chat.completions.create(). Every call can be
+slowed down with a fixed latency and can randomly fail with a 429, and
+every call is counted so benchmarks can report API usage.
+"""
+
+import base64
+import datetime
+import random
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+# --- Synthetic mail templates: (subject, sender, body) ---
+# A mix that hits every branch of rule_based_classify and leaves
+# the rest for the (fake) LLM.
+TEMPLATES = [
+    ("Your weekly digest", "digest@news.example.com", "Here is your weekly digest. Unsubscribe any time."),
+    ("Big sale this weekend", "offers@shop.example.com", "Huge discount on everything. Limited time offer."),
+    ("You win a lottery!", "claims@spam.example.com", "Claim your prize now, urgent."),
+    ("Meeting notes", "colleague@work.example.com", "Notes from today's sync, action items below."),
+    ("Dinner on Friday?", "friend@mail.example.com", "Are you free on Friday evening?"),
+    ("Invoice #{n}", "billing@vendor.example.com", "Please find attached invoice {n} for last month."),
+    ("Build #{n} passed", "ci@build.example.com", "Pipeline {n} finished successfully on main."),
+    ("Re: project plan", "lead@work.example.com", "Thanks, looks good. Let's go with option two."),
+]
+
+LLM_CATEGORIES = ["Work", "Personal", "Priority", "Newsletter", "Promotional", "Spam"]
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+def gmail_http_error(status, reason, message):
+    """Builds the HttpError the real Gmail client raises for a status code."""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    resp = httplib2.Response({"status": status})
+    resp.reason = reason
+    return HttpError(resp, f'{{"error": {{"code": {status}, "message": "{message}"}}}}'.encode())
+
+
+def rate_limit_error(service_name):
+    """Builds the error the real client raises on HTTP 429."""
+    if service_name == "gmail":
+        return gmail_http_error(429, "Too Many Requests", "rateLimitExceeded")
+
+    import httpx
+    import groq
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, request=request)
+    return groq.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class CallCounter:
+    """Thread-safe API call accounting shared by a fake and its requests."""
+
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = {}
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def hit(self, name):
+        """Records one API call; sleeps for the latency and maybe raises 429."""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            throttled = self._rng.random() < self.rate_limit_rate
+            if throttled:
+                self.rate_limited += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return throttled
+
+    def total(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "rate_limited": self.rate_limited,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Synthetic mailbox
+# ---------------------------------------------------------------------------
+
+class SyntheticMailbox:
+    """
+    A deterministic mailbox of `size` messages, newest first.
+
+    Messages are never materialised: everything about message `i` (date,
+    size, headers, body) is derived from its index, so a 1M-message
+    mailbox costs only the set of deleted IDs.
+    """
+
+    def __init__(self, size, span_days=3650, end=None):
+        self.size = size
+        end = end or datetime.datetime.now()
+        self.end_ms = int(end.timestamp() * 1000)
+        self.step_ms = max(1, (span_days * MS_PER_DAY) // max(size, 1))
+        self.deleted = set()
+        self._lock = threading.Lock()
+
+    # --- Index <-> ID ---
+    @staticmethod
+    def message_id(i):
+        return f"{i:016x}"
+
+    def index_of(self, msg_id):
+        i = int(msg_id, 16)
+        if i >= self.size:
+            raise KeyError(msg_id)
+        return i
+
+    # --- Per-message attributes ---
+    def internal_date(self, i):
+        return self.end_ms - i * self.step_ms
+
+    @staticmethod
+    def size_estimate(i):
+        # Mostly small mails with a long tail, and the odd >5MB attachment.
+        if i % 997 == 0:
+            return 6_000_000 + (i % 1000) * 1000
+        return 2_000 + (i * 2654435761) % 150_000
+
+    @staticmethod
+    def template(i):
+        subject, sender, body = TEMPLATES[(i * 7919) % len(TEMPLATES)]
+        return subject.format(n=i), sender, body.format(n=i)
+
+    def is_deleted(self, msg_id):
+        with self._lock:
+            return msg_id in self.deleted
+
+    def delete(self, msg_id):
+        self.index_of(msg_id)
+        with self._lock:
+            self.deleted.add(msg_id)
+
+    def email_row(self, i, category=None):
+        """Row tuple in the shape of the `emails` table, for seeding a DB."""
+        subject, sender, body = self.template(i)
+        dt = datetime.datetime.fromtimestamp(self.internal_date(i) / 1000)
+        return (
+            self.message_id(i), subject, sender, body, category,
+            self.size_estimate(i), dt.isoformat()
+        )
+
+    # --- Gmail resources ---
+    def message_resource(self, msg_id):
+        i = self.index_of(msg_id)
+        subject, sender, body = self.template(i)
+        date = datetime.datetime.fromtimestamp(self.internal_date(i) / 1000)
+        data = base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")
+        return {
+            "id": msg_id,
+            "threadId": msg_id,
+            "internalDate": str(self.internal_date(i)),
+            "sizeEstimate": self.size_estimate(i),
+            "payload": {
+                "mimeType": "multipart/alternative",
+                "headers": [
+                    {"name": "Subject", "value": subject},
+                    {"name": "From", "value": sender},
+                    {"name": "Date", "value": date.strftime("%a, %d %b %Y %H:%M:%S")},
+                ],
+                "parts": [
+                    {"mimeType": "text/plain", "body": {"data": data}},
+                ],
+            },
+        }
+
+    def index_range(self, query):
+        """Maps a Gmail query's before:/after: terms to an index range [lo, hi)."""
+        lo, hi = 0, self.size
+        for term in (query or "").split():
+            key, _, value = term.partition(":")
+            if key not in ("before", "after") or not value:
+                continue
+            if value.isdigit():
+                bound_ms = int(value) * 1000 # epoch seconds
+            else:
+                bound_ms = int(datetime.datetime.strptime(value, "%Y/%m/%d").timestamp() * 1000)
+            # internal_date(i) decreases with i
+            offset = (self.end_ms - bound_ms) // self.step_ms
+            if key == "before":
+                # internal_date < bound  <=>  i > offset
+                lo = max(lo, offset + 1)
+            else:
+                # internal_date >= bound  <=>  i <= offset
+                hi = min(hi, offset + 1)
+        lo = max(lo, 0)
+        hi = max(min(hi, self.size), lo)
+        return lo, hi
+
+
+# ---------------------------------------------------------------------------
+# Fake Gmail service
+# ---------------------------------------------------------------------------
+
+class _FakeRequest:
+    """Stands in for googleapiclient.http.HttpRequest."""
+
+    def __init__(self, counter, name, fn):
+        self._counter = counter
+        self._name = name
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        # Like the real client, retry 429s up to num_retries times
+        for _ in range(num_retries):
+            if not self._counter.hit(self._name):
+                return self._fn()
+        if self._counter.hit(self._name):
+            raise rate_limit_error("gmail")
+        return self._fn()
+
+    def _run_in_batch(self):
+        # Sub-requests of a batch are billed to the batch, not counted on their own.
+        return self._fn()
+
+
+class _FakeBatch:
+    """Stands in for googleapiclient.http.BatchHttpRequest."""
+
+    MAX_REQUESTS = 1000
+
+    def __init__(self, counter, callback=None):
+        self._counter = counter
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= self.MAX_REQUESTS:
+            raise ValueError(f"Exceeded the maximum of {self.MAX_REQUESTS} calls in a single batch.")
+        if request_id is None:
+            request_id = str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback))
+
+    def execute(self):
+        throttled = self._counter.hit("batch")
+        for request_id, request, callback in self._requests:
+            callback = callback or self._callback
+            response, exception = None, None
+            if throttled:
+                exception = rate_limit_error("gmail")
+            else:
+                try:
+                    response = request._run_in_batch()
+                except Exception as e:
+                    exception = e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _FakeMessages:
+    def __init__(self, mailbox, counter):
+        self._mailbox = mailbox
+        self._counter = counter
+
+    def list(self, userId="me", q="", maxResults=100, pageToken=None, **kwargs):
+        def run():
+            lo, hi = self._mailbox.index_range(q)
+            offset = int(pageToken) if pageToken else lo
+            page_size = min(maxResults or 100, 500)
+            messages = []
+            while offset < hi and len(messages) < page_size:
+                msg_id = self._mailbox.message_id(offset)
+                if not self._mailbox.is_deleted(msg_id):
+                    messages.append({"id": msg_id, "threadId": msg_id})
+                offset += 1
+            response = {"resultSizeEstimate": hi - lo}
+            if messages:
+                response["messages"] = messages
+            if offset < hi:
+                response["nextPageToken"] = str(offset)
+            return response
+        return _FakeRequest(self._counter, "messages.list", run)
+
+    def get(self, userId="me", id=None, format="full", **kwargs):
+        def run():
+            if self._mailbox.is_deleted(id):
+                raise gmail_http_error(404, "Not Found", "Requested entity was not found.")
+            return self._mailbox.message_resource(id)
+        return _FakeRequest(self._counter, "messages.get", run)
+
+    def delete(self, userId="me", id=None):
+        def run():
+            self._mailbox.delete(id)
+            return ""
+        return _FakeRequest(self._counter, "messages.delete", run)
+
+    def batchDelete(self, userId="me", body=None):
+        def run():
+            ids = (body or {}).get("ids", [])
+            if len(ids) > 1000:
+                raise ValueError("batchDelete accepts at most 1000 ids.")
+            for msg_id in ids:
+                self._mailbox.delete(msg_id)
+            return ""
+        return _FakeRequest(self._counter, "messages.batchDelete", run)
+
+
+class _FakeUsers:
+    def __init__(self, mailbox, counter):
+        self._messages = _FakeMessages(mailbox, counter)
+
+    def messages(self):
+        return self._messages
+
+
+class FakeGmailService:
+    """Drop-in for the object returned by gmail_connect()."""
+
+    def __init__(self, mailbox, latency=0.0, rate_limit_rate=0.0, seed=0, counter=None):
+        self.mailbox = mailbox
+        self.counter = counter or CallCounter(latency, rate_limit_rate, seed)
+        self._users = _FakeUsers(mailbox, self.counter)
+
+    def new_service(self, account_id=None):
+        """
+        Stands in for gmail_pool.new_service: another service on the same
+        mailbox whose calls are counted together with this one's.
+        """
+        return FakeGmailService(self.mailbox, counter=self.counter)
+
+    def users(self):
+        return self._users
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self.counter, callback)
+
+
+# ---------------------------------------------------------------------------
+# Fake Groq client
+# ---------------------------------------------------------------------------
+
+class _FakeCompletions:
+    def __init__(self, counter):
+        self._counter = counter
+
+    def create(self, model=None, messages=None, temperature=None, **kwargs):
+        if self._counter.hit("chat.completions.create"):
+            raise rate_limit_error("groq")
+        prompt = messages[-1]["content"] if messages else ""
+        category = LLM_CATEGORIES[zlib.crc32(prompt.encode("utf-8")) % len(LLM_CATEGORIES)]
+        message = SimpleNamespace(role="assistant", content=category)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)])
+
+
+class FakeGroq:
+    """Drop-in for groq.Groq: answers with a category derived from the prompt."""
+
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, seed=0):
+        self.counter = CallCounter(latency, rate_limit_rate, seed)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self.counter))
@@ -1,13 +1,21 @@
 # classifier.py
-from groq import Groq
 import os # Add this to the top of your file
 
-# This will read the key from your computer's "environment"
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY not set. Please set this environment variable.")
+# The Groq client is built on first use (see get_client), so importing
+# this module stays cheap and doesn't need GROQ_API_KEY.
+client = None
 
-client = Groq(api_key=GROQ_API_KEY)
+
+def get_client():
+    global client
+    if client is None:
+        # This will read the key from your computer's "environment"
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not set. Please set this environment variable.")
+        from groq import Groq
+        client = Groq(api_key=api_key)
+    return client
 
 
 NEWSLETTER_KEYWORDS = [
@@ -49,7 +57,7 @@ Sender: {sender}
 Return only category name.
 """
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="llama-3.1-8b-instant",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.0
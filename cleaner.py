@@ -1,28 +1,141 @@
 # cleaner.py
 import datetime
 
-def should_delete(email, categories_selected):
+# --- Cleanup policy rules ---
+# A rule is a dict of conditions that must ALL hold; an email is deleted
+# if ANY rule matches. Supported conditions:
+#   category          - a category name or list of names
+#   sender            - substring of the From header (case-insensitive)
+#   older_than_days   - email is more than this many days old
+#   larger_than_bytes - email size is above this many bytes
+# "reason" is an optional message template; it can use {category},
+# {age_days} and {size_mb}.
+
+DEFAULT_RULES = [
+    {"category": "Spam", "reason": "Spam Email"},
+    {"category": "Newsletter", "older_than_days": 60, "reason": "Old Newsletter ({age_days} days)"},
+    {"larger_than_bytes": 5 * 1024 * 1024, "reason": "Large Email ({size_mb:.1f}MB)"},
+]
+
+RULE_CONDITIONS = ("category", "sender", "older_than_days", "larger_than_bytes")
+
+
+def build_policy(categories_selected=(), rules=(), use_default_rules=True):
     """
-    categories_selected = list of categories user wants to auto-delete
+    Returns the ordered rule list for a policy: whole-category deletes
+    first, then user-defined rules, then (optionally) DEFAULT_RULES.
     """
+    policy = []
+    if categories_selected:
+        policy.append({
+            "category": list(categories_selected),
+            "reason": "User selected auto-clean for {category}"
+        })
+    policy.extend(rules)
+    if use_default_rules:
+        policy.extend(DEFAULT_RULES)
+    return policy
 
-    category = email["category"]
-    size = email["size"]
-    now = datetime.datetime.now()
+
+def _validate_rule(rule):
+    conditions = [k for k in rule if k != "reason"]
+    unknown = [k for k in conditions if k not in RULE_CONDITIONS]
+    if unknown:
+        raise ValueError(f"Unknown rule condition(s): {', '.join(unknown)}")
+    if not conditions:
+        raise ValueError("A rule needs at least one condition.")
+    if "sender" in rule and not rule["sender"]:
+        raise ValueError("A sender condition cannot be empty.")
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+# SQLite's lower() only folds ASCII letters; fold the same way in Python
+# so sender rules match the same emails in SQL and in rule_matches.
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _fold_case(text):
+    return (text or "").translate(_ASCII_LOWER)
+
+
+def compile_policy(policy, account_id=None, now=None):
+    """
+    Compiles a rule list into a single SQL predicate over the emails table.
+    Returns (where_sql, params). Every condition maps to an indexed column
+    except sender, which is a plain substring test (instr, so % and _ in
+    the rule are not wildcards). With account_id, each rule is
+    restricted to that account so it can use the account-prefixed indexes.
+    """
+    now = now or datetime.datetime.now()
+    clauses, params = [], []
+
+    for rule in policy:
+        _validate_rule(rule)
+        terms = []
+
+        if account_id is not None:
+            terms.append("account_id = ?")
+            params.append(account_id)
+
+        if "category" in rule:
+            categories = _as_list(rule["category"])
+            terms.append(f"category IN ({', '.join('?' for _ in categories)})")
+            params.extend(categories)
+
+        if "sender" in rule:
+            terms.append("instr(lower(sender), ?) > 0")
+            params.append(_fold_case(rule["sender"]))
+
+        if "older_than_days" in rule:
+            # Same as should_delete's "age_days > N": at least N+1 whole days old
+            cutoff = now - datetime.timedelta(days=int(rule["older_than_days"]) + 1)
+            terms.append("datetime <= ?")
+            params.append(cutoff.isoformat())
+
+        if "larger_than_bytes" in rule:
+            terms.append("size > ?")
+            params.append(int(rule["larger_than_bytes"]))
+
+        clauses.append("(" + " AND ".join(terms) + ")")
+
+    if not clauses:
+        return "0", []
+    return " OR ".join(clauses), params
+
+
+def rule_matches(email, rule, now=None):
+    """Row-by-row equivalent of one compiled rule, for a single email dict."""
+    now = now or datetime.datetime.now()
     age_days = (now - email["datetime"]).days
 
-    # If user chose to delete this category → delete
-    if category in categories_selected:
-        return True, f"User selected auto-clean for {category}"
+    if "category" in rule and email["category"] not in _as_list(rule["category"]):
+        return False
+    if "sender" in rule and _fold_case(rule["sender"]) not in _fold_case(email.get("sender")):
+        return False
+    if "older_than_days" in rule and not age_days > rule["older_than_days"]:
+        return False
+    if "larger_than_bytes" in rule and not email["size"] > rule["larger_than_bytes"]:
+        return False
+    return True
 
-    # Default rules (optional)
-    if category == "Spam":
-        return True, "Spam Email"
 
-    if category == "Newsletter" and age_days > 60:
-        return True, f"Old Newsletter ({age_days} days)"
+def should_delete(email, categories_selected, rules=()):
+    """
+    categories_selected = list of categories user wants to auto-delete
+    rules = extra user-defined rules (see DEFAULT_RULES for the format)
+    """
+    now = datetime.datetime.now()
 
-    if size > 5 * 1024 * 1024:
-        return True, f"Large Email ({size/1_000_000:.1f}MB)"
+    for rule in build_policy(categories_selected, rules):
+        if rule_matches(email, rule, now):
+            age_days = (now - email["datetime"]).days
+            reason = rule.get("reason", "Matched cleanup policy")
+            return True, reason.format(
+                category=email["category"],
+                age_days=age_days,
+                size_mb=email["size"] / 1_000_000
+            )
 
     return False, None
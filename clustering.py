@@ -0,0 +1,146 @@
+# clustering.py
+
+"""
+Near-duplicate clustering with MinHash + LSH.
+
+Notification templates, digests and reply chains produce lots of
+near-identical mail. Each email gets a MinHash signature over word
+shingles of its subject and body; the signature is split into bands,
+and emails sharing any band bucket are candidates for the same cluster.
+A new email joins the most similar candidate cluster (and reuses its
+category) or starts a new one.
+"""
+
+import random
+import re
+import zlib
+from array import array
+from hashlib import blake2b
+
+from database import (
+    DEFAULT_ACCOUNT_ID, find_cluster_candidates, create_cluster,
+    set_cluster_category
+)
+
+NUM_PERM = 64 # Signature length
+BANDS = 16 # NUM_PERM / BANDS = 4 rows per band (~0.5 Jaccard threshold)
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3 # Words per shingle
+MATCH_THRESHOLD = 0.6 # Estimated Jaccard needed to join a cluster
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures must stay comparable across runs
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def shingles(subject, body):
+    """
+    Word shingles of subject + body. Text is lowercased and numbers are
+    masked, so "Invoice #123" and "Invoice #456" look the same.
+    """
+    text = f"{subject or ''} {body or ''}".lower()
+    words = re.findall(r"\w+", re.sub(r"\d+", "0", text))
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash_signature(subject, body):
+    """Returns the MinHash signature (NUM_PERM 32-bit ints) of an email."""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(subject, body)]
+    signature = []
+    for a, b in _PERMUTATIONS:
+        signature.append(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes))
+    return signature
+
+
+def band_keys(signature):
+    """One 63-bit bucket key per band, for the LSH table."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = blake2b(array("I", rows).tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1) # fits SQLite INTEGER
+    return keys
+
+
+def estimate_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def signature_to_blob(signature):
+    return array("I", signature).tobytes()
+
+
+def signature_from_blob(blob):
+    signature = array("I")
+    signature.frombytes(blob)
+    return list(signature)
+
+
+def match_cluster(signature, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Looks up the LSH index for the best matching cluster.
+    Returns (cluster_id, category) or (None, None).
+    """
+    best_id, best_category, best_score = None, None, MATCH_THRESHOLD
+    for cluster_id, category, blob in find_cluster_candidates(account_id, band_keys(signature)):
+        score = estimate_similarity(signature, signature_from_blob(blob))
+        if score >= best_score:
+            best_id, best_category, best_score = cluster_id, category, score
+    return best_id, best_category
+
+
+def assign_cluster(email, classify, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Puts a new email dict into a cluster and sets its category.
+    `classify(subject, body, sender)` is only called when the email starts
+    a new cluster (or joins one that has no category yet).
+    Returns True if the category was reused from an existing cluster.
+    """
+    signature = minhash_signature(email["subject"], email["body"])
+    cluster_id, category = match_cluster(signature, account_id)
+
+    if cluster_id is not None and category:
+        email["cluster_id"] = cluster_id
+        email["category"] = category
+        return True
+
+    email["category"] = classify(email["subject"], email["body"], email["sender"])
+    if cluster_id is None:
+        cluster_id = _new_cluster(signature, email, account_id)
+    elif email["category"]:
+        # First classified member of a cluster built by a CLUSTER job:
+        # later members reuse this category
+        set_cluster_category(cluster_id, email["category"])
+    email["cluster_id"] = cluster_id
+    return False
+
+
+def cluster_of(email, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Cluster id for an email that is already classified (used to index
+    mail fetched before clustering existed). Never changes its category.
+    """
+    signature = minhash_signature(email["subject"], email["body"])
+    cluster_id, _ = match_cluster(signature, account_id)
+    if cluster_id is None:
+        cluster_id = _new_cluster(signature, email, account_id)
+    return cluster_id
+
+
+def _new_cluster(signature, email, account_id):
+    return create_cluster(
+        account_id, email.get("category"), signature_to_blob(signature),
+        band_keys(signature), email["subject"]
+    )
@@ -1,14 +1,41 @@
 # database.py
 
+import os
 import sqlite3
 from datetime import datetime
 
 DB_NAME = "emails.db"
 
+# The account that existed before multi-account support; it keeps
+# using token.json in the working directory.
+DEFAULT_ACCOUNT_ID = 1
+TOKENS_DIR = "tokens"
+
+def _add_column_if_missing(c, table, column, declaration):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
 def init_db():
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
 
+    # WAL lets the dashboard read while jobs for several accounts write
+    c.execute("PRAGMA journal_mode=WAL")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        token_path TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+    c.execute("""
+    INSERT OR IGNORE INTO accounts (id, name, token_path, created_at)
+    VALUES (?, 'default', 'token.json', ?)
+    """, (DEFAULT_ACCOUNT_ID, datetime.now().isoformat()))
+
     c.execute("""
     CREATE TABLE IF NOT EXISTS emails (
         id TEXT PRIMARY KEY,
@@ -17,7 +44,9 @@ def init_db():
         body TEXT,
         category TEXT,
         size INTEGER,
-        datetime TEXT
+        datetime TEXT,
+        account_id INTEGER NOT NULL DEFAULT 1,
+        cluster_id INTEGER
     )
     """)
 
@@ -25,7 +54,8 @@ def init_db():
     CREATE TABLE IF NOT EXISTS deleted_emails (
         id TEXT PRIMARY KEY,
         size INTEGER,
-        deleted_at TEXT
+        deleted_at TEXT,
+        account_id INTEGER NOT NULL DEFAULT 1
     )
     """)
 
@@ -41,32 +71,200 @@ def init_db():
         parameters TEXT,
         status TEXT DEFAULT 'PENDING',
         progress_message TEXT,
+        created_at TEXT NOT NULL,
+        account_id INTEGER NOT NULL DEFAULT 1
+    )
+    """)
+
+    # Databases from before multi-account support: everything in them
+    # belongs to the default account
+    for table in ("emails", "deleted_emails", "jobs"):
+        _add_column_if_missing(c, table, "account_id", "INTEGER NOT NULL DEFAULT 1")
+    _add_column_if_missing(c, "emails", "cluster_id", "INTEGER")
+
+    # Covering index for DELETE jobs: (account_id, category, id, size) lets
+    # them page through a category by id without touching the table itself.
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_emails_account_category
+    ON emails (account_id, category, id, size)
+    """)
+
+    # Indexes for POLICY jobs (age and size rules)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_account_datetime ON emails (account_id, datetime)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_account_size ON emails (account_id, size)")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    # --- Near-duplicate clusters (see clustering.py) ---
+    # One row per cluster: its category, the MinHash signature of the
+    # email that started it and that email's subject as a label.
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        account_id INTEGER NOT NULL,
+        category TEXT,
+        signature BLOB NOT NULL,
+        label TEXT,
         created_at TEXT NOT NULL
     )
     """)
 
+    # LSH table: (band, bucket) -> cluster that first landed there
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        account_id INTEGER NOT NULL,
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        cluster_id INTEGER NOT NULL,
+        PRIMARY KEY (account_id, band, bucket)
+    ) WITHOUT ROWID
+    """)
+
+    # Covering index for cluster counts/bytes and cluster deletes
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_emails_account_cluster
+    ON emails (account_id, cluster_id, id, size)
+    """)
+
+    # Emails selected by a POLICY job or a search DELETE job, staged so
+    # the job can delete them in chunks after a single selection pass
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS job_matches (
+        job_id INTEGER NOT NULL,
+        id TEXT NOT NULL,
+        size INTEGER,
+        PRIMARY KEY (job_id, id)
+    )
+    """)
+
+    # --- Date shards of BACKFILL jobs ---
+    # One row per after/before date range. DONE shards mark ranges that
+    # are fully fetched, so later backfills skip them.
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS backfill_shards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER NOT NULL,
+        account_id INTEGER NOT NULL,
+        after_date TEXT NOT NULL,
+        before_date TEXT NOT NULL,
+        estimated INTEGER DEFAULT 0,
+        listed INTEGER DEFAULT 0,
+        fetched INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'PENDING',
+        updated_at TEXT
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_backfill_shards_account ON backfill_shards (account_id, status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_backfill_shards_job ON backfill_shards (job_id)")
+
+    # --- Full-text search over subject, sender and body ---
+    # External-content FTS5 table: the text stays in emails and the index
+    # is keyed by emails.rowid. The triggers keep it in sync with every
+    # insert/delete done by save_email and delete_email(s)_from_db.
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'")
+    fts_is_new = c.fetchone() is None
+    c.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+        subject, sender, body,
+        content='emails', content_rowid='rowid'
+    )
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts (rowid, subject, sender, body)
+        VALUES (new.rowid, new.subject, new.sender, new.body);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body)
+        VALUES ('delete', old.rowid, old.subject, old.sender, old.body);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_update AFTER UPDATE OF subject, sender, body ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, sender, body)
+        VALUES ('delete', old.rowid, old.subject, old.sender, old.body);
+        INSERT INTO emails_fts (rowid, subject, sender, body)
+        VALUES (new.rowid, new.subject, new.sender, new.body);
+    END
+    """)
+    if fts_is_new:
+        # Index emails fetched before search existed
+        c.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+
+    conn.commit()
+    conn.close()
+
+# --- ACCOUNT REGISTRY ---
+def add_account(name):
+    """
+    Registers a Gmail account. Its token is created on first use, in a
+    file named after the account id so no two accounts can share one.
+    """
+    name = name.strip()
+    if not name:
+        raise ValueError("Account name cannot be empty.")
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    INSERT INTO accounts (name, token_path, created_at)
+    VALUES (?, '', ?)
+    """, (name, datetime.now().isoformat()))
+    account_id = c.lastrowid
+    token_path = os.path.join(TOKENS_DIR, f"account_{account_id}.json")
+    c.execute("UPDATE accounts SET token_path = ? WHERE id = ?", (token_path, account_id))
     conn.commit()
     conn.close()
+    return account_id
+
+def get_accounts():
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM accounts ORDER BY id ASC")
+    accounts = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return accounts
+
+def get_account(account_id):
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM accounts WHERE id = ?", (account_id,))
+    row = c.fetchone()
+    conn.close()
+    return dict(row) if row else None
 
 # --- NEW FUNCTION TO CREATE A JOB ---
-def create_job(job_type, parameters="{}"):
+def create_job(job_type, parameters="{}", account_id=DEFAULT_ACCOUNT_ID):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
     c.execute("""
-    INSERT INTO jobs (job_type, parameters, status, created_at)
-    VALUES (?, ?, 'PENDING', ?)
-    """, (job_type, parameters, datetime.now().isoformat()))
+    INSERT INTO jobs (job_type, parameters, status, created_at, account_id)
+    VALUES (?, ?, 'PENDING', ?, ?)
+    """, (job_type, parameters, datetime.now().isoformat(), account_id))
     job_id = c.lastrowid
     conn.commit()
     conn.close()
     return job_id
 
 # --- HELPER FUNCTIONS FOR THE WORKER ---
-def get_next_job():
+def get_next_job(busy_account_ids=()):
+    """
+    Claims the oldest pending job, skipping accounts that already have a
+    job running so each account's jobs run one at a time.
+    """
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT * FROM jobs WHERE status = 'PENDING' ORDER BY created_at ASC LIMIT 1")
+    busy = list(busy_account_ids)
+    placeholders = ", ".join("?" for _ in busy)
+    skip_busy = f"AND account_id NOT IN ({placeholders})" if busy else ""
+    c.execute(f"""
+    SELECT * FROM jobs WHERE status = 'PENDING' {skip_busy}
+    ORDER BY created_at ASC LIMIT 1
+    """, busy)
     job = c.fetchone()
     if job:
         # Mark job as RUNNING
@@ -115,21 +313,25 @@ def save_email(email):
     c = conn.cursor()
     c.execute("""
     INSERT OR IGNORE INTO emails 
-    (id, subject, sender, body, category, size, datetime)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
+    (id, subject, sender, body, category, size, datetime, account_id, cluster_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         email["id"], email["subject"], email["sender"],
         email["body"], email.get("category"), email["size"],
-        email["datetime"]
+        email["datetime"], email.get("account_id", DEFAULT_ACCOUNT_ID),
+        email.get("cluster_id")
     ))
     conn.commit()
     conn.close()
 
 
-def get_all_emails():
+def get_all_emails(account_id=DEFAULT_ACCOUNT_ID):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
-    c.execute("SELECT * FROM emails ORDER BY datetime ASC")
+    c.execute("""
+    SELECT id, subject, sender, body, category, size, datetime
+    FROM emails WHERE account_id = ? ORDER BY datetime ASC
+    """, (account_id,))
     rows = c.fetchall()
     conn.close()
     return rows
@@ -138,32 +340,440 @@ def get_all_emails():
 def delete_email_from_db(msg_id):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
-    c.execute("SELECT size FROM emails WHERE id = ?", (msg_id,))
+    c.execute("SELECT size, account_id FROM emails WHERE id = ?", (msg_id,))
     row = c.fetchone()
     if row:
-        size = row[0]
+        size, account_id = row
         c.execute("""
-        INSERT OR REPLACE INTO deleted_emails (id, size, deleted_at)
-        VALUES (?, ?, ?)
-        """, (msg_id, size, datetime.now().isoformat()))
+        INSERT OR REPLACE INTO deleted_emails (id, size, deleted_at, account_id)
+        VALUES (?, ?, ?, ?)
+        """, (msg_id, size, datetime.now().isoformat(), account_id))
         c.execute("DELETE FROM emails WHERE id = ?", (msg_id,))
     conn.commit()
     conn.close()
 
 
-def get_storage_saved():
+def delete_emails_from_db(msg_ids):
+    """Bulk version of delete_email_from_db: one transaction for all IDs."""
+    if not msg_ids:
+        return
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    deleted_at = datetime.now().isoformat()
+    for msg_id in msg_ids:
+        c.execute("""
+        INSERT OR REPLACE INTO deleted_emails (id, size, deleted_at, account_id)
+        SELECT id, size, ?, account_id FROM emails WHERE id = ?
+        """, (deleted_at, msg_id))
+        c.execute("DELETE FROM emails WHERE id = ?", (msg_id,))
+    conn.commit()
+    conn.close()
+
+
+# Columns DELETE jobs can select on
+_SELECTABLE_COLUMNS = ("category", "cluster_id")
+
+def _count_emails_in(column, values, account_id):
+    if column not in _SELECTABLE_COLUMNS:
+        raise ValueError(f"Cannot select emails by {column}")
+    if not values:
+        return 0, 0
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    placeholders = ", ".join("?" for _ in values)
+    c.execute(
+        f"SELECT COUNT(*), SUM(size) FROM emails WHERE account_id = ? AND {column} IN ({placeholders})",
+        [account_id] + list(values)
+    )
+    count, total = c.fetchone()
+    conn.close()
+    return count, total or 0
+
+def _iter_email_ids_in(column, values, chunk_size, account_id):
+    if column not in _SELECTABLE_COLUMNS:
+        raise ValueError(f"Cannot select emails by {column}")
+    for value in values:
+        last_id = ""
+        while True:
+            conn = sqlite3.connect(DB_NAME)
+            c = conn.cursor()
+            c.execute(f"""
+            SELECT id, size FROM emails
+            WHERE account_id = ? AND {column} = ? AND id > ?
+            ORDER BY id LIMIT ?
+            """, (account_id, value, last_id, chunk_size))
+            rows = c.fetchall()
+            conn.close()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+
+
+def count_emails_by_category(categories, account_id=DEFAULT_ACCOUNT_ID):
+    """Returns (count, total_size) of an account's emails in the given categories."""
+    return _count_emails_in("category", categories, account_id)
+
+
+def iter_email_ids_by_category(categories, chunk_size=500, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Yields lists of (id, size) for an account's emails in the given categories,
+    at most chunk_size at a time. Pages by id on idx_emails_account_category,
+    so memory stays constant and callers may delete each chunk before
+    asking for the next one.
+    """
+    return _iter_email_ids_in("category", categories, chunk_size, account_id)
+
+
+def count_emails_by_cluster(cluster_ids, account_id=DEFAULT_ACCOUNT_ID):
+    """Returns (count, total_size) of an account's emails in the given clusters."""
+    return _count_emails_in("cluster_id", cluster_ids, account_id)
+
+
+def iter_email_ids_by_cluster(cluster_ids, chunk_size=500, account_id=DEFAULT_ACCOUNT_ID):
+    """Like iter_email_ids_by_category, paging on idx_emails_account_cluster."""
+    return _iter_email_ids_in("cluster_id", cluster_ids, chunk_size, account_id)
+
+
+# --- NEAR-DUPLICATE CLUSTERS ---
+def find_cluster_candidates(account_id, bucket_keys):
+    """
+    Clusters sharing at least one LSH bucket with the given band keys.
+    Returns a list of (cluster_id, category, signature).
+    """
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    # Joining against a VALUES list gives one primary-key seek per band
+    keys = ", ".join("(?, ?)" for _ in bucket_keys)
+    c.execute(f"""
+    SELECT id, category, signature FROM clusters WHERE id IN (
+        SELECT b.cluster_id FROM (VALUES {keys}) AS k
+        JOIN lsh_buckets AS b
+        ON b.account_id = ? AND b.band = k.column1 AND b.bucket = k.column2
+    )
+    """, [v for band, key in enumerate(bucket_keys) for v in (band, key)] + [account_id])
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def create_cluster(account_id, category, signature, bucket_keys, label):
+    """Adds a cluster and claims any of its LSH buckets not taken yet."""
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    INSERT INTO clusters (account_id, category, signature, label, created_at)
+    VALUES (?, ?, ?, ?, ?)
+    """, (account_id, category, signature, label, datetime.now().isoformat()))
+    cluster_id = c.lastrowid
+    c.executemany("""
+    INSERT OR IGNORE INTO lsh_buckets (account_id, band, bucket, cluster_id)
+    VALUES (?, ?, ?, ?)
+    """, [(account_id, band, key, cluster_id) for band, key in enumerate(bucket_keys)])
+    conn.commit()
+    conn.close()
+    return cluster_id
+
+
+def set_cluster_category(cluster_id, category):
+    """Gives a cluster its category, unless it already has one."""
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
-    c.execute("SELECT SUM(size) FROM deleted_emails")
+    c.execute(
+        "UPDATE clusters SET category = ? WHERE id = ? AND category IS NULL",
+        (category, cluster_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_unclustered_emails(account_id=DEFAULT_ACCOUNT_ID, limit=500):
+    """Up to `limit` emails of an account that have no cluster yet."""
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("""
+    SELECT id, subject, body, category FROM emails
+    WHERE account_id = ? AND cluster_id IS NULL
+    LIMIT ?
+    """, (account_id, limit))
+    rows = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def set_email_clusters(assignments):
+    """Bulk-sets cluster_id from a list of (email_id, cluster_id)."""
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.executemany(
+        "UPDATE emails SET cluster_id = ? WHERE id = ?",
+        [(cluster_id, email_id) for email_id, cluster_id in assignments]
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_cluster_summaries(account_id=DEFAULT_ACCOUNT_ID, min_emails=2, limit=100):
+    """
+    Largest clusters of an account by bytes, as dicts with
+    cluster_id, label, category, emails and bytes.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("""
+    SELECT counts.cluster_id, clusters.label, clusters.category,
+           counts.emails, counts.bytes
+    FROM (
+        SELECT cluster_id, COUNT(*) AS emails, SUM(size) AS bytes
+        FROM emails
+        WHERE account_id = ? AND cluster_id IS NOT NULL
+        GROUP BY cluster_id
+        HAVING COUNT(*) >= ?
+    ) AS counts
+    JOIN clusters ON clusters.id = counts.cluster_id
+    ORDER BY counts.bytes DESC
+    LIMIT ?
+    """, (account_id, min_emails, limit))
+    rows = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def preview_policy(where_sql, params):
+    """Dry run of a compiled policy: returns (count, total_size) of matches."""
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute(f"SELECT COUNT(*), SUM(size) FROM emails WHERE {where_sql}", params)
+    count, total = c.fetchone()
+    conn.close()
+    return count, total or 0
+
+
+def stage_policy_matches(job_id, where_sql, params):
+    """
+    Copies the (id, size) of every email matching a compiled policy into
+    job_matches in one pass. Returns (count, total_size).
+    """
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("DELETE FROM job_matches WHERE job_id = ?", (job_id,))
+    c.execute(f"""
+    INSERT INTO job_matches (job_id, id, size)
+    SELECT ?, id, size FROM emails WHERE {where_sql}
+    """, [job_id] + list(params))
+    c.execute("SELECT COUNT(*), SUM(size) FROM job_matches WHERE job_id = ?", (job_id,))
+    count, total = c.fetchone()
+    conn.commit()
+    conn.close()
+    return count, total or 0
+
+
+# --- FULL-TEXT SEARCH ---
+def _fts_query(text, prefix=True):
+    """
+    Turns free text into a safe FTS5 query: every word must appear.
+    With prefix, the last word also matches as a prefix (for
+    search-as-you-type); deletes use exact words only.
+    """
+    words = text.split()
+    if not words:
+        return None
+    terms = ['"' + w.replace('"', '""') + '"' for w in words]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_emails(text, account_id=DEFAULT_ACCOUNT_ID, limit=50, offset=0, prefix=True):
+    """
+    Ranked full-text search over subject, sender and body (subject hits
+    weigh most). Returns one page of
+    (id, subject, sender, category, size, datetime) rows, best first.
+    """
+    query = _fts_query(text, prefix)
+    if query is None:
+        return []
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    SELECT e.id, e.subject, e.sender, e.category, e.size, e.datetime
+    FROM emails_fts
+    JOIN emails AS e ON e.rowid = emails_fts.rowid
+    WHERE emails_fts MATCH ? AND e.account_id = ?
+    ORDER BY bm25(emails_fts, 10.0, 5.0, 1.0)
+    LIMIT ? OFFSET ?
+    """, (query, account_id, limit, offset))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def count_search_matches(text, account_id=DEFAULT_ACCOUNT_ID, prefix=True):
+    """Returns (count, total_size) of an account's emails matching a search."""
+    query = _fts_query(text, prefix)
+    if query is None:
+        return 0, 0
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    SELECT COUNT(*), SUM(e.size)
+    FROM emails_fts
+    JOIN emails AS e ON e.rowid = emails_fts.rowid
+    WHERE emails_fts MATCH ? AND e.account_id = ?
+    """, (query, account_id))
+    count, total = c.fetchone()
+    conn.close()
+    return count, total or 0
+
+
+def stage_search_matches(job_id, text, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Copies the (id, size) of every email matching a search into
+    job_matches in one index lookup. Words match exactly (no prefix), so
+    a delete never selects more than was typed. Returns (count, total_size).
+    """
+    query = _fts_query(text, prefix=False)
+    if query is None:
+        return 0, 0
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("DELETE FROM job_matches WHERE job_id = ?", (job_id,))
+    c.execute("""
+    INSERT INTO job_matches (job_id, id, size)
+    SELECT ?, e.id, e.size
+    FROM emails_fts
+    JOIN emails AS e ON e.rowid = emails_fts.rowid
+    WHERE emails_fts MATCH ? AND e.account_id = ?
+    """, (job_id, query, account_id))
+    c.execute("SELECT COUNT(*), SUM(size) FROM job_matches WHERE job_id = ?", (job_id,))
+    count, total = c.fetchone()
+    conn.commit()
+    conn.close()
+    return count, total or 0
+
+
+def iter_job_matches(job_id, chunk_size=500):
+    """Yields lists of (id, size) staged for a job, chunk_size at a time."""
+    last_id = ""
+    while True:
+        conn = sqlite3.connect(DB_NAME)
+        c = conn.cursor()
+        c.execute("""
+        SELECT id, size FROM job_matches
+        WHERE job_id = ? AND id > ?
+        ORDER BY id LIMIT ?
+        """, (job_id, last_id, chunk_size))
+        rows = c.fetchall()
+        conn.close()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+
+def clear_job_matches(job_id):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("DELETE FROM job_matches WHERE job_id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+
+# --- BACKFILL SHARDS ---
+def get_completed_shard_ranges(account_id=DEFAULT_ACCOUNT_ID):
+    """(after_date, before_date) ISO date pairs of an account's DONE shards."""
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    SELECT after_date, before_date FROM backfill_shards
+    WHERE account_id = ? AND status = 'DONE'
+    ORDER BY after_date ASC
+    """, (account_id,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def create_backfill_shards(job_id, account_id, shards):
+    """
+    Records the shards planned by a BACKFILL job, given as
+    (after_date, before_date, estimate). Unfinished shards left by
+    earlier backfills of the account are dropped; their ranges are
+    part of the new plan.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    now = datetime.now().isoformat()
+    c.execute("DELETE FROM backfill_shards WHERE account_id = ? AND status != 'DONE'", (account_id,))
+    c.executemany("""
+    INSERT INTO backfill_shards
+    (job_id, account_id, after_date, before_date, estimated, status, updated_at)
+    VALUES (?, ?, ?, ?, ?, 'PENDING', ?)
+    """, [
+        (job_id, account_id, after.isoformat(), before.isoformat(), estimate, now)
+        for after, before, estimate in shards
+    ])
+    conn.commit()
+    conn.close()
+
+
+def get_job_shards(job_id):
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM backfill_shards WHERE job_id = ? ORDER BY after_date DESC", (job_id,))
+    rows = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def update_shard(shard_id, status=None, listed=None, fetched=None):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""
+    UPDATE backfill_shards SET
+        status = COALESCE(?, status),
+        listed = COALESCE(?, listed),
+        fetched = COALESCE(?, fetched),
+        updated_at = ?
+    WHERE id = ?
+    """, (status, listed, fetched, datetime.now().isoformat(), shard_id))
+    conn.commit()
+    conn.close()
+
+
+def get_backfill_shards(account_id=DEFAULT_ACCOUNT_ID, limit=200):
+    """Most recent shards of an account, newest date range first."""
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("""
+    SELECT * FROM backfill_shards WHERE account_id = ?
+    ORDER BY after_date DESC LIMIT ?
+    """, (account_id, limit))
+    rows = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def get_storage_saved(account_id=DEFAULT_ACCOUNT_ID):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT SUM(size) FROM deleted_emails WHERE account_id = ?", (account_id,))
     total = c.fetchone()[0]
     conn.close()
     return (total or 0) / 1_000_000
 
 
-def get_oldest_datetime():
+def get_oldest_datetime(account_id=DEFAULT_ACCOUNT_ID):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
-    c.execute("SELECT datetime FROM emails ORDER BY datetime ASC LIMIT 1")
+    c.execute("""
+    SELECT datetime FROM emails WHERE account_id = ?
+    ORDER BY datetime ASC LIMIT 1
+    """, (account_id,))
     row = c.fetchone()
     conn.close()
     return row[0] if row else None
\ No newline at end of file
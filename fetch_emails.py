@@ -1,45 +1,25 @@
 # fetch_emails.py
 
 from __future__ import print_function
-import os.path
 import base64
 import datetime
 from datetime import timedelta # Add this
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from database import DEFAULT_ACCOUNT_ID, email_exists
+from gmail_pool import get_service
 
-from database import email_exists
+# The Google client libraries are imported inside the functions that
+# need them, so importing this module (and the worker) stays fast.
 
-print("Token path:", os.path.abspath("token.json"))
-
-SCOPES = [
-    "https://mail.google.com/",
-    "https://www.googleapis.com/auth/gmail.modify"
-]
-
-# --- (gmail_connect and safe_list_request are unchanged) ---
-
-def gmail_connect():
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                "credentials.json", SCOPES
-            )
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    return build("gmail", "v1", credentials=creds)
+def gmail_connect(account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Returns the Gmail service for an account, built on first call and
+    reused afterwards (see gmail_pool).
+    """
+    return get_service(account_id)
 
 def safe_list_request(service, **kwargs):
+    from googleapiclient.errors import HttpError
     try:
         return service.users().messages().list(**kwargs).execute()
     except HttpError:
@@ -168,4 +148,96 @@ def get_query_from_date(option, custom_date=None):
     elif option == "Custom" and custom_date:
         query = f"before:{custom_date.strftime('%Y/%m/%d')}"
     
-    return query
\ No newline at end of file
+    return query
+
+# --- DATE-SHARDED BACKFILL ---
+# Gmail has nothing older than its launch, so a backfill starts here
+BACKFILL_EARLIEST = datetime.date(2004, 4, 1)
+LIST_PAGE_SIZE = 500 # Gmail's maximum for messages.list
+LIST_RETRIES = 5 # Retries (with backoff) for 429s and 5xx on list calls
+
+def parse_before_date(query):
+    """Pulls the date out of a 'before:YYYY/MM/DD' query, or None."""
+    for term in (query or "").split():
+        if term.startswith("before:"):
+            return datetime.datetime.strptime(term[len("before:"):], "%Y/%m/%d").date()
+    return None
+
+def utc_midnight(day):
+    """Seconds since the epoch at midnight UTC of a date."""
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp())
+
+def date_range_query(after_date, before_date):
+    """
+    Gmail query for messages from midnight UTC of after_date up to
+    midnight UTC of before_date. Uses epoch seconds, since Gmail reads
+    YYYY/MM/DD dates as midnight Pacific time whatever the server's zone.
+    """
+    return f"after:{utc_midnight(after_date)} before:{utc_midnight(before_date)}"
+
+def estimate_count(service, query):
+    """Gmail's resultSizeEstimate for a query (one cheap list call)."""
+    res = service.users().messages().list(
+        userId="me", q=query, maxResults=1
+    ).execute(num_retries=LIST_RETRIES)
+    return res.get("resultSizeEstimate", 0)
+
+def plan_shards(service, after_date, before_date, target_size):
+    """
+    Splits [after_date, before_date) into date ranges of roughly
+    target_size messages each, by halving ranges whose
+    resultSizeEstimate is too large. A single day is never split.
+    Returns a list of (after_date, before_date, estimate).
+    """
+    shards = []
+    pending = [(after_date, before_date)]
+    while pending:
+        start, end = pending.pop()
+        estimate = estimate_count(service, date_range_query(start, end))
+        days = (end - start).days
+        if estimate > target_size and days > 1:
+            middle = start + timedelta(days=days // 2)
+            pending.append((middle, end))
+            pending.append((start, middle))
+        else:
+            shards.append((start, end, estimate))
+    return sorted(shards)
+
+def uncovered_ranges(after_date, before_date, covered):
+    """
+    The parts of [after_date, before_date) not inside any of the
+    `covered` (after, before) ranges.
+    """
+    gaps = []
+    cursor = after_date
+    for start, end in sorted(covered):
+        if end <= cursor:
+            continue
+        if start >= before_date:
+            break
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < before_date:
+        gaps.append((cursor, before_date))
+    return gaps
+
+def list_message_ids(service, query):
+    """
+    Every message ID matching a query. Unlike fetch_all_emails this has
+    no limit and raises on errors, so a shard is never marked complete
+    after a partial listing.
+    """
+    ids = []
+    page_token = None
+    while True:
+        response = service.users().messages().list(
+            userId="me",
+            q=query,
+            maxResults=LIST_PAGE_SIZE,
+            pageToken=page_token
+        ).execute(num_retries=LIST_RETRIES)
+        ids.extend(m["id"] for m in response.get("messages", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return ids
@@ -0,0 +1,213 @@
+# gmail_pool.py
+
+"""
+One Gmail service per account, built on first use and reused.
+
+Each account also gets its own RateBudget: every API request spends
+quota units from it before going out, so jobs for different accounts
+run in parallel while each stays under Gmail's per-user rate limit.
+"""
+
+import os.path
+import threading
+import time
+
+from database import DEFAULT_ACCOUNT_ID, get_account
+
+SCOPES = [
+    "https://mail.google.com/",
+    "https://www.googleapis.com/auth/gmail.modify"
+]
+
+# Gmail allows 250 quota units per user per second
+QUOTA_UNITS_PER_SECOND = 250
+
+# Quota cost of the methods the worker uses; anything else costs 5
+QUOTA_COSTS = {
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.batchDelete": 50,
+    "gmail.users.getProfile": 1,
+}
+DEFAULT_QUOTA_COST = 5
+
+
+class RateBudget:
+    """Token bucket of Gmail quota units, refilled continuously."""
+
+    def __init__(self, units_per_second=QUOTA_UNITS_PER_SECOND):
+        self.units_per_second = units_per_second
+        self._available = float(units_per_second)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def spend(self, units):
+        """Blocks until `units` are available, then takes them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(
+                    self.units_per_second,
+                    self._available + (now - self._last_refill) * self.units_per_second
+                )
+                self._last_refill = now
+                if self._available >= units:
+                    self._available -= units
+                    return
+                wait = (units - self._available) / self.units_per_second
+            time.sleep(wait)
+
+
+def _budgeted_request_class(budget):
+    """An HttpRequest subclass that spends from `budget` before each call."""
+    from googleapiclient.http import HttpRequest
+
+    class BudgetedHttpRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            budget.spend(QUOTA_COSTS.get(self.methodId, DEFAULT_QUOTA_COST))
+            return super().execute(http=http, num_retries=num_retries)
+
+    return BudgetedHttpRequest
+
+
+def _save_credentials(creds, token_path):
+    # Write to a temp file and swap it in, so the token file is never
+    # seen half-written
+    token_dir = os.path.dirname(token_path)
+    if token_dir:
+        os.makedirs(token_dir, exist_ok=True)
+    tmp_path = token_path + ".tmp"
+    with open(tmp_path, "w") as token:
+        token.write(creds.to_json())
+    os.replace(tmp_path, token_path)
+
+
+def _load_credentials(token_path):
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    print("Token path:", os.path.abspath(token_path))
+    creds = None
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                "credentials.json", SCOPES
+            )
+            creds = flow.run_local_server(port=0)
+        _save_credentials(creds, token_path)
+    return creds
+
+
+def _refresh_credentials(creds, token_path):
+    from google.auth.transport.requests import Request
+
+    creds.refresh(Request())
+    _save_credentials(creds, token_path)
+
+
+def build_service(creds, budget):
+    """
+    Builds a Gmail service from the discovery document bundled with
+    google-api-python-client (static_discovery), so no discovery request
+    is made on startup.
+    """
+    from googleapiclient.discovery import build
+
+    return build(
+        "gmail", "v1", credentials=creds,
+        static_discovery=True, cache_discovery=False,
+        requestBuilder=_budgeted_request_class(budget)
+    )
+
+
+class GmailServicePool:
+    """
+    Caches one service, one set of credentials and one RateBudget per
+    account.
+
+    A service (and its underlying httplib2 connection) is not thread-safe,
+    so the worker runs at most one job per account at a time, and a job
+    that wants more threads asks for extra services with new_service().
+    All services of an account share its credentials, which are read from
+    the token file (and refreshed) only under the account's lock.
+    """
+
+    def __init__(self, units_per_second=QUOTA_UNITS_PER_SECOND):
+        self.units_per_second = units_per_second
+        self._services = {}
+        self._budgets = {}
+        self._credentials = {} # account_id -> (creds, token_path)
+        self._account_locks = {}
+        self._lock = threading.Lock()
+
+    def budget(self, account_id):
+        with self._lock:
+            if account_id not in self._budgets:
+                self._budgets[account_id] = RateBudget(self.units_per_second)
+            return self._budgets[account_id]
+
+    def _account_lock(self, account_id):
+        with self._lock:
+            return self._account_locks.setdefault(account_id, threading.Lock())
+
+    def credentials(self, account_id=DEFAULT_ACCOUNT_ID):
+        """
+        The account's credentials: loaded from its token file once (which
+        may open the Google login on first use), then kept in memory and
+        refreshed here when expired, so concurrent threads never re-read
+        or rewrite the file themselves.
+        """
+        with self._account_lock(account_id):
+            cached = self._credentials.get(account_id)
+            if cached is None:
+                account = get_account(account_id)
+                if account is None:
+                    raise ValueError(f"Unknown account id: {account_id}")
+                creds = _load_credentials(account["token_path"])
+                self._credentials[account_id] = (creds, account["token_path"])
+                return creds
+
+            creds, token_path = cached
+            if not creds.valid:
+                if not creds.refresh_token:
+                    # Start over from the token file on the next job
+                    del self._credentials[account_id]
+                    raise RuntimeError(f"Gmail login for account {account_id} expired; sign in again.")
+                _refresh_credentials(creds, token_path)
+            return creds
+
+    def get(self, account_id=DEFAULT_ACCOUNT_ID):
+        with self._lock:
+            service = self._services.get(account_id)
+        if service is not None:
+            return service
+
+        service = build_service(self.credentials(account_id), self.budget(account_id))
+
+        with self._lock:
+            # Another thread may have built it meanwhile; keep the first one
+            return self._services.setdefault(account_id, service)
+
+    def new_service(self, account_id=DEFAULT_ACCOUNT_ID):
+        """
+        An extra, uncached service for one more thread working on the same
+        account (e.g. a backfill shard). It shares the account's
+        credentials and RateBudget, so parallel threads neither touch the
+        token file nor go over the account's quota.
+        """
+        return build_service(self.credentials(account_id), self.budget(account_id))
+
+
+_pool = GmailServicePool()
+
+def get_service(account_id=DEFAULT_ACCOUNT_ID):
+    return _pool.get(account_id)
+
+def new_service(account_id=DEFAULT_ACCOUNT_ID):
+    return _pool.new_service(account_id)
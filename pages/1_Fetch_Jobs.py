@@ -2,12 +2,17 @@
 
 import streamlit as st
 import json
-import pandas as pd
-from database import create_job, get_oldest_datetime, get_all_emails
+from database import (
+    create_job, get_oldest_datetime, get_all_emails,
+    search_emails, count_search_matches, get_backfill_shards
+)
+from account_picker import select_account
 import datetime
 
 st.title("🔎 Fetch & Classify Emails")
 
+account_id = select_account()
+
 # --- Navigation ---
 col1, col2 = st.columns(2)
 with col1:
@@ -20,7 +25,7 @@ with col2:
 st.divider()
 
 # --- Smart Date Fetcher ---
-oldest_date_str = get_oldest_datetime()
+oldest_date_str = get_oldest_datetime(account_id)
 if oldest_date_str:
     oldest_date = datetime.datetime.fromisoformat(oldest_date_str).date()
     # Format date as "18 April 2023"
@@ -44,22 +49,69 @@ if st.button("Start Background Fetch Job", type="primary"):
     
     query = f"before:{custom_date.strftime('%Y/%m/%d')}"
     params = json.dumps({"query": query})
-    job_id = create_job("FETCH", params)
+    job_id = create_job("FETCH", params, account_id)
     
     st.success(f"Successfully created 'FETCH' job (ID: {job_id}).")
     st.write(f"The worker is now fetching all emails matching: '{query}'.")
     st.info("You can go to the Main Dashboard to monitor its progress.")
+
+st.caption("Very large mailbox? A backfill splits the date range into shards and fetches them in parallel. Re-running it skips shards that already finished.")
+
+if st.button("Start Parallel Backfill Job"):
+    query = f"before:{custom_date.strftime('%Y/%m/%d')}"
+    params = json.dumps({"query": query})
+    job_id = create_job("BACKFILL", params, account_id)
+
+    st.success(f"Successfully created 'BACKFILL' job (ID: {job_id}).")
+    st.info("Shard progress is shown below.")
+
+shards = get_backfill_shards(account_id)
+if shards:
+    with st.expander("Backfill shards"):
+        done = sum(1 for sh in shards if sh["status"] == "DONE")
+        st.write(f"**{done}** of **{len(shards)}** shards done.")
+        st.dataframe(
+            [{
+                "From": sh["after_date"], "Before": sh["before_date"], "Status": sh["status"],
+                "Estimated": sh["estimated"], "Listed": sh["listed"], "Fetched": sh["fetched"]
+            } for sh in shards],
+            use_container_width=True
+        )
+        if st.button("Refresh Shards"):
+            st.rerun()
     
 st.divider()
 
+# --- SEARCH FETCHED EMAILS ---
+st.subheader("🔍 Search Fetched Emails")
+SEARCH_PAGE_SIZE = 25
+
+search_text = st.text_input("Search subject, sender and body:")
+if search_text.strip():
+    match_count, _ = count_search_matches(search_text, account_id)
+    if match_count == 0:
+        st.info("No emails match this search.")
+    else:
+        total_pages = (match_count + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        page = st.number_input(f"Page (of {total_pages}):", min_value=1, max_value=total_pages, value=1)
+        results = search_emails(search_text, account_id, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE)
+        st.write(f"**{match_count}** emails match, best matches first.")
+        st.dataframe(
+            [{"datetime": r[5], "subject": r[1], "sender": r[2], "category": r[3], "size": r[4]} for r in results],
+            use_container_width=True
+        )
+
+st.divider()
+
 # --- VIEW ALL FETCHED EMAILS (Moved here) ---
 st.subheader("📧 All Fetched Emails")
-emails = get_all_emails()
+emails = get_all_emails(account_id)
 
 if len(emails) == 0:
     st.info("No emails fetched yet.")
 else:
     with st.expander(f"Click to view all {len(emails)} fetched emails in your database"):
+        import pandas as pd
         df = pd.DataFrame(emails, columns=[
             "id", "subject", "sender", "body", "category", "size", "datetime"
         ])
@@ -1,12 +1,19 @@
 # pages/2_Clean_Jobs.py
 
 import streamlit as st
-import pandas as pd
 import json
-from database import create_job, get_all_emails
+from database import (
+    create_job, get_all_emails, preview_policy,
+    get_cluster_summaries, count_emails_by_cluster,
+    search_emails, count_search_matches
+)
+from cleaner import build_policy, compile_policy
+from account_picker import select_account
 
 st.title("🧹 Clean & Delete Emails")
 
+account_id = select_account()
+
 # --- Navigation ---
 col1, col2 = st.columns(2)
 with col1:
@@ -21,7 +28,8 @@ st.divider()
 st.info("Schedule a job to delete emails *that are already in your database*.")
 
 def load_data():
-    emails = get_all_emails()
+    import pandas as pd
+    emails = get_all_emails(account_id)
     if not emails:
         return None
     df = pd.DataFrame(emails, columns=[
@@ -65,6 +73,133 @@ if st.button("Schedule Background Delete Job", type="primary"):
         params = json.dumps({
             "categories": selected_categories
         })
-        job_id = create_job("DELETE", params)
+        job_id = create_job("DELETE", params, account_id)
+        st.success(f"Successfully created 'DELETE' job (ID: {job_id}).")
+        st.info("You can go to the Main Dashboard to monitor its progress.")
+st.divider()
+
+# --- Rule-based cleanup (POLICY job) ---
+st.subheader("📏 Rule-Based Cleanup")
+st.write("Delete emails matching rules, evaluated directly in the database.")
+
+use_default_rules = st.checkbox(
+    "Include default rules (Spam, Newsletters older than 60 days, emails over 5MB)",
+    value=True
+)
+
+with st.expander("Add a custom rule (all filled-in conditions must match)"):
+    rule_categories = st.multiselect("Category is one of:", all_categories, key="rule_categories")
+    rule_sender = st.text_input("Sender contains:", key="rule_sender")
+    rule_age = st.number_input("Older than (days, 0 = any):", min_value=0, value=0, step=30)
+    rule_size = st.number_input("Larger than (MB, 0 = any):", min_value=0.0, value=0.0, step=1.0)
+
+custom_rule = {}
+if rule_categories:
+    custom_rule["category"] = rule_categories
+if rule_sender.strip():
+    custom_rule["sender"] = rule_sender.strip()
+if rule_age:
+    custom_rule["older_than_days"] = int(rule_age)
+if rule_size:
+    custom_rule["larger_than_bytes"] = int(rule_size * 1_000_000)
+custom_rules = [custom_rule] if custom_rule else []
+
+policy = build_policy(selected_categories, custom_rules, use_default_rules)
+
+if policy:
+    where_sql, where_params = compile_policy(policy, account_id=account_id)
+    policy_count, policy_size = preview_policy(where_sql, where_params)
+    st.warning(f"Dry run: this policy matches **{policy_count}** emails, saving **{policy_size / 1_000_000:.2f} MB**.")
+    if selected_categories:
+        st.caption("Categories selected above are included in the policy.")
+else:
+    st.info("Enable the default rules or add a custom rule to see a preview.")
+
+if st.button("Schedule Policy Cleanup Job"):
+    if not policy:
+        st.error("The policy has no rules.")
+    else:
+        params = json.dumps({
+            "categories": selected_categories,
+            "rules": custom_rules,
+            "use_default_rules": use_default_rules
+        })
+        job_id = create_job("POLICY", params, account_id)
+        st.success(f"Successfully created 'POLICY' job (ID: {job_id}).")
+        st.info("You can go to the Main Dashboard to monitor its progress.")
+
+st.divider()
+
+# --- Near-duplicate clusters ---
+st.subheader("🧬 Near-Duplicate Clusters")
+st.write("Groups of near-identical emails (notification templates, digests, reply chains).")
+
+clusters = get_cluster_summaries(account_id)
+
+if st.button("Index Existing Emails into Clusters"):
+    job_id = create_job("CLUSTER", "{}", account_id)
+    st.success(f"Successfully created 'CLUSTER' job (ID: {job_id}).")
+    st.info("New emails are clustered automatically as they are fetched.")
+
+if not clusters:
+    st.info("No clusters with more than one email yet.")
+else:
+    cluster_labels = {
+        cl["cluster_id"]: f"{cl['label']} — {cl['emails']} emails, {cl['bytes'] / 1_000_000:.2f} MB ({cl['category']})"
+        for cl in clusters
+    }
+    st.dataframe(
+        [{"Cluster": cl["label"], "Category": cl["category"], "Emails": cl["emails"], "MB": round(cl["bytes"] / 1_000_000, 2)} for cl in clusters],
+        use_container_width=True
+    )
+
+    selected_clusters = st.multiselect(
+        "Select clusters to delete (will delete ALL emails in each cluster):",
+        list(cluster_labels),
+        format_func=lambda cluster_id: cluster_labels[cluster_id]
+    )
+
+    if selected_clusters:
+        cluster_count, cluster_size = count_emails_by_cluster(selected_clusters, account_id)
+        st.warning(f"This job will delete **{cluster_count}** emails, saving **{cluster_size / 1_000_000:.2f} MB**.")
+
+    if st.button("Schedule Cluster Delete Job"):
+        if not selected_clusters:
+            st.error("Please select at least one cluster.")
+        else:
+            params = json.dumps({
+                "cluster_ids": selected_clusters
+            })
+            job_id = create_job("DELETE", params, account_id)
+            st.success(f"Successfully created 'DELETE' job (ID: {job_id}).")
+            st.info("You can go to the Main Dashboard to monitor its progress.")
+
+st.divider()
+
+# --- Search-based cleanup ---
+st.subheader("🔍 Delete by Search")
+st.write("Delete every email whose subject, sender or body contains all the words of a search (whole words only).")
+
+delete_search = st.text_input("Search:", key="delete_search")
+
+if delete_search.strip():
+    search_count, search_size = count_search_matches(delete_search, account_id, prefix=False)
+    st.warning(f"This job will delete **{search_count}** emails, saving **{search_size / 1_000_000:.2f} MB**.")
+    if search_count:
+        with st.expander("Click to see the top matches"):
+            top_matches = search_emails(delete_search, account_id, limit=50, prefix=False)
+            st.dataframe(
+                [{"datetime": r[5], "subject": r[1], "sender": r[2], "category": r[3]} for r in top_matches],
+                use_container_width=True
+            )
+
+if st.button("Schedule Search Delete Job"):
+    if not delete_search.strip():
+        st.error("Please enter a search.")
+    else:
+        params = json.dumps({
+            "search": delete_search.strip()
+        })
+        job_id = create_job("DELETE", params, account_id)
         st.success(f"Successfully created 'DELETE' job (ID: {job_id}).")
-        st.info("You can go to the Main Dashboard to monitor its progress.")
\ No newline at end of file
+        st.info("You can go to the Main Dashboard to monitor its progress.")
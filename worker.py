@@ -2,23 +2,58 @@
 import time
 import sqlite3
 import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from database import (
     DB_NAME, get_next_job, update_job_progress,
     mark_job_done, mark_job_failed,
-    save_email, delete_email_from_db, get_all_emails
+    save_email, delete_emails_from_db,
+    count_emails_by_category, iter_email_ids_by_category,
+    preview_policy, stage_policy_matches, iter_job_matches,
+    clear_job_matches, count_emails_by_cluster, iter_email_ids_by_cluster,
+    get_unclustered_emails, set_email_clusters, stage_search_matches,
+    email_exists, get_completed_shard_ranges, create_backfill_shards,
+    get_job_shards, update_shard
 )
-from fetch_emails import gmail_connect, get_email_details, fetch_all_emails
+from fetch_emails import (
+    gmail_connect, get_email_details, fetch_all_emails,
+    BACKFILL_EARLIEST, parse_before_date, date_range_query,
+    plan_shards, uncovered_ranges, list_message_ids
+)
+from gmail_pool import new_service
 from classifier import classify_email
-
-import pandas as pd
+from cleaner import build_policy, compile_policy
+from clustering import assign_cluster, cluster_of
 
 SLEEP_WHEN_EMPTY = 10 # Check for new jobs every 10 seconds
+SLEEP_WHEN_BUSY = 1 # Poll interval while jobs are running
+MAX_PARALLEL_JOBS = 4 # Accounts processed at the same time
+DELETE_BATCH_SIZE = 500 # Emails per batchDelete call (Gmail allows up to 1000)
+SLEEP_BETWEEN_BATCHES = 10 # Pause between delete batches (rate limits)
+CLUSTER_BATCH_SIZE = 500 # Emails indexed per DB round trip in CLUSTER jobs
+BACKFILL_SHARD_SIZE = 5000 # Target emails per backfill date shard
+BACKFILL_THREADS = 4 # Shards listed and fetched at the same time
+SHARD_PROGRESS_EVERY = 50 # Emails between shard progress updates
 
 # --- Helper to make terminal output clear ---
 def worker_log(message):
     print(f"[WORKER] {message}")
 # -------------------------------------------
 
+def process_email(service, email_id, account_id):
+    """
+    Fetches, classifies and stores one email. Near-duplicates reuse their
+    cluster's category instead of being classified again; returns True
+    when that happened.
+    """
+    data = get_email_details(service, email_id)
+    data["account_id"] = account_id
+    reused = assign_cluster(data, classify_email, account_id)
+    save_email(data)
+    return reused
+
+
 def run_fetch_job(service, job):
     job_id = job['id']
     try:
@@ -36,11 +71,11 @@ def run_fetch_job(service, job):
 
         update_job_progress(job_id, f"Found {total_to_fetch} new emails. Fetching details...")
 
+        reused = 0
         for i, email_id in enumerate(email_ids):
             try:
-                data = get_email_details(service, email_id)
-                data["category"] = classify_email(data["subject"], data["body"], data["sender"])
-                save_email(data)
+                if process_email(service, email_id, job['account_id']):
+                    reused += 1
                 
                 if (i + 1) % 10 == 0:
                     update_job_progress(job_id, f"Processed {i+1} / {total_to_fetch} emails.")
@@ -48,117 +83,395 @@ def run_fetch_job(service, job):
             except Exception as e:
                 worker_log(f"Failed to process email {email_id}: {e}")
 
-        mark_job_done(job_id, f"Successfully fetched and classified {total_to_fetch} emails.")
-        worker_log(f"Job {job_id} (FETCH) finished. Processed {total_to_fetch} emails.")
+        mark_job_done(job_id, f"Successfully fetched and classified {total_to_fetch} emails ({reused} matched an existing cluster).")
+        worker_log(f"Job {job_id} (FETCH) finished. Processed {total_to_fetch} emails, {reused} reused a cluster category.")
 
     except Exception as e:
         worker_log(f"Job {job_id} (FETCH) failed: {e}")
         mark_job_failed(job_id, str(e))
 
 
+def delete_one_by_one(service, ids):
+    """
+    Fallback for a failed batchDelete: deletes each id on its own, so one
+    stale or invalid id doesn't keep the rest of the chunk. Returns the
+    ids that were deleted.
+    """
+    deleted = []
+    for email_id in ids:
+        try:
+            service.users().messages().delete(userId="me", id=email_id).execute()
+            deleted.append(email_id)
+        except Exception as e:
+            worker_log(f"Failed to delete email {email_id}: {e}")
+    return deleted
+
+
+def delete_in_batches(service, job, chunks, total_to_delete):
+    """
+    Deletes each chunk of (id, size) rows with a single batchDelete call
+    and removes it from the DB. Chunks are streamed from the DB, so memory
+    doesn't grow with the mailbox. If a batchDelete fails, the chunk is
+    retried one email at a time. Returns (deleted_count, failed_count).
+    """
+    job_id = job['id']
+    job_type = job['job_type']
+    deleted_count = failed_count = 0
+
+    for batch in chunks:
+        ids = [email_id for email_id, _ in batch]
+        try:
+            service.users().messages().batchDelete(
+                userId="me",
+                body={"ids": ids}
+            ).execute()
+            deleted = ids
+        except Exception as e:
+            worker_log(f"Batch delete of {len(ids)} emails starting at {ids[0]} failed: {e}. Retrying one by one...")
+            deleted = delete_one_by_one(service, ids)
+
+        delete_emails_from_db(deleted)
+        deleted_count += len(deleted)
+        failed_count += len(ids) - len(deleted)
+
+        update_job_progress(job_id, f"Deleted {deleted_count} / {total_to_delete} emails...")
+        worker_log(f"Job {job_id} ({job_type}): Batch complete. {deleted_count}/{total_to_delete} done. Sleeping...")
+        time.sleep(SLEEP_BETWEEN_BATCHES)
+
+    return deleted_count, failed_count
+
+
+def deletion_summary(deleted_count, failed_count):
+    message = f"Successfully deleted {deleted_count} emails."
+    if failed_count:
+        message += f" {failed_count} emails could not be deleted and are still stored."
+    return message
+
+
 def run_delete_job(service, job):
     job_id = job['id']
     try:
         params = json.loads(job['parameters'])
         categories = params.get('categories', [])
+        cluster_ids = params.get('cluster_ids', [])
+        search = params.get('search', '').strip()
         
-        if not categories:
-            mark_job_failed(job_id, "No categories specified for deletion.")
+        if not categories and not cluster_ids and not search:
+            mark_job_failed(job_id, "No categories, clusters or search specified for deletion.")
             return
         
-        worker_log(f"Job {job_id} (DELETE) started. Categories: {categories}")
-        update_job_progress(job_id, f"Finding all emails in categories: {categories}")
+        if search:
+            worker_log(f"Job {job_id} (DELETE) started. Search: '{search}'")
+            update_job_progress(job_id, f"Finding all emails matching: '{search}'")
+            # Matches are staged once so chunks don't re-run the search
+            total_to_delete, _ = stage_search_matches(job_id, search, job['account_id'])
+            chunks = iter_job_matches(job_id, chunk_size=DELETE_BATCH_SIZE)
+        elif cluster_ids:
+            worker_log(f"Job {job_id} (DELETE) started. Clusters: {cluster_ids}")
+            update_job_progress(job_id, f"Finding all emails in {len(cluster_ids)} clusters")
+            total_to_delete, _ = count_emails_by_cluster(cluster_ids, job['account_id'])
+            chunks = iter_email_ids_by_cluster(cluster_ids, DELETE_BATCH_SIZE, job['account_id'])
+        else:
+            worker_log(f"Job {job_id} (DELETE) started. Categories: {categories}")
+            update_job_progress(job_id, f"Finding all emails in categories: {categories}")
+            total_to_delete, _ = count_emails_by_category(categories, job['account_id'])
+            chunks = iter_email_ids_by_category(categories, DELETE_BATCH_SIZE, job['account_id'])
 
-        all_emails = get_all_emails()
-        df = pd.DataFrame(all_emails, columns=[
-            "id", "subject", "sender", "body", "category", "size", "datetime"
-        ])
-        
-        target_emails = df[df['category'].isin(categories)].copy()
-        
-        emails_to_delete = []
-        for _, row in target_emails.iterrows():
-            emails_to_delete.append({"id": row["id"], "size": row["size"]})
-        
-        total_to_delete = len(emails_to_delete)
         if total_to_delete == 0:
+            clear_job_matches(job_id)
             mark_job_done(job_id, "No emails found matching the criteria.")
             worker_log(f"Job {job_id} (DELETE) done. No emails found to delete.")
             return
 
         update_job_progress(job_id, f"Found {total_to_delete} emails to delete. Starting batches...")
-        
-        BATCH_SIZE = 25
-        SLEEP_BETWEEN_BATCHES = 10
-        deleted_count = 0
 
-        for i in range(0, total_to_delete, BATCH_SIZE):
-            batch = emails_to_delete[i:i+BATCH_SIZE]
-            
-            for email in batch:
-                try:
-                    service.users().messages().delete(
-                        userId="me",
-                        id=email["id"]
-                    ).execute()
-                    delete_email_from_db(email["id"])
-                    deleted_count += 1
-                except Exception as e:
-                    worker_log(f"Failed to delete email {email['id']}: {e}")
-            
-            update_job_progress(job_id, f"Deleted {deleted_count} / {total_to_delete} emails...")
-            worker_log(f"Job {job_id} (DELETE): Batch complete. {deleted_count}/{total_to_delete} done. Sleeping...")
-            time.sleep(SLEEP_BETWEEN_BATCHES)
+        deleted_count, failed_count = delete_in_batches(service, job, chunks, total_to_delete)
+        clear_job_matches(job_id)
 
-        mark_job_done(job_id, f"Successfully deleted {deleted_count} emails.")
-        worker_log(f"Job {job_id} (DELETE) finished. Deleted {deleted_count} emails.")
+        message = deletion_summary(deleted_count, failed_count)
+        mark_job_done(job_id, message)
+        worker_log(f"Job {job_id} (DELETE) finished. {message}")
     
     except Exception as e:
         worker_log(f"Job {job_id} (DELETE) failed: {e}")
         mark_job_failed(job_id, str(e))
 
 
-def run_worker():
-    """The main loop for the background worker."""
-    worker_log("Starting background job worker...")
+def run_policy_job(service, job):
+    job_id = job['id']
     try:
-        service = gmail_connect()
-        worker_log("Gmail connection successful.")
+        params = json.loads(job['parameters'])
+        policy = build_policy(
+            params.get('categories', []),
+            params.get('rules', []),
+            params.get('use_default_rules', True)
+        )
+        dry_run = params.get('dry_run', False)
+
+        if not policy:
+            mark_job_failed(job_id, "No cleanup rules specified.")
+            return
+
+        worker_log(f"Job {job_id} (POLICY) started. {len(policy)} rules, dry_run={dry_run}")
+        update_job_progress(job_id, f"Evaluating {len(policy)} cleanup rules...")
+
+        where_sql, where_params = compile_policy(policy, account_id=job['account_id'])
+
+        if dry_run:
+            count, total_size = preview_policy(where_sql, where_params)
+            mark_job_done(job_id, f"Dry run: {count} emails match, {total_size / 1_000_000:.2f} MB.")
+            worker_log(f"Job {job_id} (POLICY) dry run: {count} emails match.")
+            return
+
+        total_to_delete, total_size = stage_policy_matches(job_id, where_sql, where_params)
+        if total_to_delete == 0:
+            clear_job_matches(job_id)
+            mark_job_done(job_id, "No emails found matching the policy.")
+            worker_log(f"Job {job_id} (POLICY) done. No emails found to delete.")
+            return
+
+        update_job_progress(job_id, f"Found {total_to_delete} emails ({total_size / 1_000_000:.2f} MB) to delete. Starting batches...")
+
+        chunks = iter_job_matches(job_id, chunk_size=DELETE_BATCH_SIZE)
+        deleted_count, failed_count = delete_in_batches(service, job, chunks, total_to_delete)
+        clear_job_matches(job_id)
+
+        message = deletion_summary(deleted_count, failed_count)
+        mark_job_done(job_id, message)
+        worker_log(f"Job {job_id} (POLICY) finished. {message}")
+
     except Exception as e:
-        worker_log(f"CRITICAL: Could not connect to Gmail. {e}")
-        worker_log("Worker will not run.")
+        worker_log(f"Job {job_id} (POLICY) failed: {e}")
+        mark_job_failed(job_id, str(e))
+
+
+def run_cluster_job(service, job):
+    """Adds already-fetched emails of an account to the near-duplicate index."""
+    job_id = job['id']
+    account_id = job['account_id']
+    try:
+        worker_log(f"Job {job_id} (CLUSTER) started.")
+        update_job_progress(job_id, "Indexing emails into near-duplicate clusters...")
+
+        indexed = 0
+        while True:
+            emails = get_unclustered_emails(account_id, limit=CLUSTER_BATCH_SIZE)
+            if not emails:
+                break
+            set_email_clusters([(e["id"], cluster_of(e, account_id)) for e in emails])
+            indexed += len(emails)
+            update_job_progress(job_id, f"Indexed {indexed} emails...")
+
+        mark_job_done(job_id, f"Successfully indexed {indexed} emails into clusters.")
+        worker_log(f"Job {job_id} (CLUSTER) finished. Indexed {indexed} emails.")
+
+    except Exception as e:
+        worker_log(f"Job {job_id} (CLUSTER) failed: {e}")
+        mark_job_failed(job_id, str(e))
+
+
+_thread_local = threading.local()
+
+def _thread_service(service_factory, account_id):
+    """
+    The Gmail service a backfill thread should use. Services are not
+    thread-safe, so each thread builds its own with service_factory (for
+    Gmail, gmail_pool.new_service, which shares the account's credentials
+    and rate budget) and reuses it for every shard it runs.
+    """
+    services = getattr(_thread_local, "services", None)
+    if services is None:
+        services = _thread_local.services = {}
+    if account_id not in services:
+        services[account_id] = service_factory(account_id)
+    return services[account_id]
+
+
+# Gmail errors that a retry won't fix, e.g. a message deleted between
+# being listed and fetched (404). 429s, 5xx and network errors can
+# succeed later, and 403 is also used for rate limits.
+PERMANENT_GMAIL_STATUSES = (400, 404, 410)
+
+def is_permanent_gmail_error(error):
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None) in PERMANENT_GMAIL_STATUSES
+
+
+def run_backfill_shard(service_factory, job, shard):
+    """Lists and fetches one date shard. Returns (fetched, completed)."""
+    shard_id = shard['id']
+    account_id = job['account_id']
+    after = datetime.date.fromisoformat(shard['after_date'])
+    before = datetime.date.fromisoformat(shard['before_date'])
+    try:
+        service = _thread_service(service_factory, account_id)
+        update_shard(shard_id, status='RUNNING')
+
+        all_ids = list_message_ids(service, date_range_query(after, before))
+        email_ids = [i for i in all_ids if not email_exists(i)]
+        update_shard(shard_id, listed=len(all_ids))
+
+        fetched = failed = skipped = 0
+        for i, email_id in enumerate(email_ids):
+            try:
+                process_email(service, email_id, account_id)
+                fetched += 1
+            except Exception as e:
+                if is_permanent_gmail_error(e):
+                    skipped += 1
+                    worker_log(f"Skipping email {email_id}: {e}")
+                else:
+                    failed += 1
+                    worker_log(f"Failed to process email {email_id}: {e}")
+            if (i + 1) % SHARD_PROGRESS_EVERY == 0:
+                update_shard(shard_id, fetched=fetched)
+
+        # A shard with retryable failures stays unfinished so a re-run
+        # retries it; emails that can never be fetched don't hold it back
+        update_shard(shard_id, status='FAILED' if failed else 'DONE', fetched=fetched)
+        return fetched, not failed
+
+    except Exception as e:
+        worker_log(f"Job {job['id']} (BACKFILL): shard {after} - {before} failed: {e}")
+        update_shard(shard_id, status='FAILED')
+        return 0, False
+
+
+def run_backfill_job(service, job, service_factory=new_service):
+    """
+    Fetches everything before the query's date by splitting the range into
+    date shards (sized from Gmail's resultSizeEstimate) and processing the
+    shards in parallel, each thread with a service from service_factory.
+    Ranges already covered by DONE shards are skipped.
+    """
+    job_id = job['id']
+    account_id = job['account_id']
+    try:
+        params = json.loads(job['parameters'])
+        query = params.get('query', '')
+        shard_size = params.get('shard_size', BACKFILL_SHARD_SIZE)
+        # Shard bounds are midnight UTC (see date_range_query). Stop at
+        # today's, which has already passed: a DONE shard reaching into
+        # the future would hide mail that arrives later from every backfill
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        before = min(parse_before_date(query) or today, today)
+        after = BACKFILL_EARLIEST
+        if params.get('after'):
+            after = datetime.datetime.strptime(params['after'], "%Y/%m/%d").date()
+
+        worker_log(f"Job {job_id} (BACKFILL) started. Range: {after} - {before}")
+        update_job_progress(job_id, f"Planning shards for {after} - {before}...")
+
+        covered = [
+            (datetime.date.fromisoformat(a), datetime.date.fromisoformat(b))
+            for a, b in get_completed_shard_ranges(account_id)
+        ]
+        shards = []
+        for gap_after, gap_before in uncovered_ranges(after, before, covered):
+            shards.extend(plan_shards(service, gap_after, gap_before, shard_size))
+
+        if not shards:
+            mark_job_done(job_id, "Everything in this range was already backfilled.")
+            worker_log(f"Job {job_id} (BACKFILL) done. Nothing left to fetch.")
+            return
+
+        create_backfill_shards(job_id, account_id, shards)
+        shard_rows = get_job_shards(job_id)
+        total_shards = len(shard_rows)
+        estimated = sum(row['estimated'] for row in shard_rows)
+        update_job_progress(job_id, f"Planned {total_shards} shards (~{estimated} emails). Fetching...")
+
+        done_shards = failed_shards = fetched = 0
+        with ThreadPoolExecutor(max_workers=BACKFILL_THREADS, thread_name_prefix=f"backfill-{job_id}") as pool:
+            futures = [pool.submit(run_backfill_shard, service_factory, job, row) for row in shard_rows]
+            for future in as_completed(futures):
+                shard_fetched, completed = future.result()
+                fetched += shard_fetched
+                if completed:
+                    done_shards += 1
+                else:
+                    failed_shards += 1
+                update_job_progress(job_id, f"Fetched {fetched} emails. Shards: {done_shards} done, {failed_shards} failed, {total_shards} total.")
+
+        message = f"Backfilled {fetched} emails in {done_shards}/{total_shards} shards."
+        if failed_shards:
+            message += f" {failed_shards} shards failed; run the backfill again to retry them."
+        mark_job_done(job_id, message)
+        worker_log(f"Job {job_id} (BACKFILL) finished. {message}")
+
+    except Exception as e:
+        worker_log(f"Job {job_id} (BACKFILL) failed: {e}")
+        mark_job_failed(job_id, str(e))
+
+
+JOB_RUNNERS = {
+    "FETCH": run_fetch_job,
+    "DELETE": run_delete_job,
+    "POLICY": run_policy_job,
+    "CLUSTER": run_cluster_job,
+    "BACKFILL": run_backfill_job,
+}
+LOCAL_JOB_TYPES = {"CLUSTER"}
+
+
+def run_job(job):
+    """Runs one job with its account's Gmail service from the pool."""
+    runner = JOB_RUNNERS.get(job['job_type'])
+    if runner is None:
+        worker_log(f"Unknown job type: {job['job_type']}. Failing job.")
+        mark_job_failed(job['id'], f"Unknown job type: {job['job_type']}")
         return
 
+    try:
+        # CLUSTER jobs only touch the DB, so they don't need a login
+        service = None if job['job_type'] in LOCAL_JOB_TYPES else gmail_connect(job['account_id'])
+    except Exception as e:
+        worker_log(f"Could not connect to Gmail for account {job['account_id']}: {e}")
+        mark_job_failed(job['id'], f"Could not connect to Gmail: {e}")
+        return
+
+    runner(service, job)
+    worker_log(f"Job {job['id']} finished. Looking for next job...")
+
+
+def run_worker():
+    """
+    The main loop for the background worker.
+    Jobs for different accounts run in parallel (up to MAX_PARALLEL_JOBS);
+    jobs for the same account run one after another.
+    """
+    worker_log("Starting background job worker...")
     worker_log("Worker is now running. Checking for jobs...")
-    
-    while True:
-        try:
-            job = get_next_job()
-            
-            if not job:
-                # No pending jobs, wait a bit
-                time.sleep(SLEEP_WHEN_EMPTY)
-                continue
-                
-            worker_log(f"Found new job (ID: {job['id']}, Type: {job['job_type']}). Processing...")
-
-            if job['job_type'] == "FETCH":
-                run_fetch_job(service, job)
-            elif job['job_type'] == "DELETE":
-                run_delete_job(service, job)
-            else:
-                worker_log(f"Unknown job type: {job['job_type']}. Failing job.")
-                mark_job_failed(job['id'], f"Unknown job type: {job['job_type']}")
-            
-            worker_log(f"Job {job['id']} finished. Looking for next job...")
 
-        except KeyboardInterrupt:
-            worker_log("Shutdown signal received. Exiting worker...")
-            break
-        except Exception as e:
-            worker_log(f"An unexpected error occurred in the main loop: {e}")
-            worker_log("Restarting loop in 30 seconds...")
-            time.sleep(30)
+    running = {} # account_id -> Future
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_JOBS, thread_name_prefix="job") as pool:
+        while True:
+            try:
+                for account_id, future in list(running.items()):
+                    if future.done():
+                        del running[account_id]
+                        if future.exception():
+                            worker_log(f"Job for account {account_id} crashed: {future.exception()}")
+
+                job = None
+                if len(running) < MAX_PARALLEL_JOBS:
+                    job = get_next_job(busy_account_ids=running.keys())
+
+                if not job:
+                    # No job we can start yet; wait a bit
+                    time.sleep(SLEEP_WHEN_BUSY if running else SLEEP_WHEN_EMPTY)
+                    continue
+
+                worker_log(f"Found new job (ID: {job['id']}, Type: {job['job_type']}, Account: {job['account_id']}). Processing...")
+                running[job['account_id']] = pool.submit(run_job, job)
+
+            except KeyboardInterrupt:
+                worker_log("Shutdown signal received. Exiting worker...")
+                break
+            except Exception as e:
+                worker_log(f"An unexpected error occurred in the main loop: {e}")
+                worker_log("Restarting loop in 30 seconds...")
+                time.sleep(30)
 
 if __name__ == "__main__":
     # This allows you to still run `python worker.py` manually if you want